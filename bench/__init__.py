@@ -0,0 +1,9 @@
+"""Offline benchmarks and regression tests for cLockIn.
+
+Everything runs on Linux with no network: Google Calendar, Google OAuth
+and Discord are in-process fakes (fakes.py) and rumps, AppKit and
+PyObjCTools.AppHelper are a headless stand-in (headless.py).
+
+    python -m bench.run            # benchmarks, compared with baselines.json
+    python -m pytest bench         # regression tests
+"""
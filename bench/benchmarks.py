@@ -0,0 +1,294 @@
+"""The benchmarks. Each takes a scratch directory and returns {metric: value}.
+
+Metric names end in their unit: `_ms` and `_us` are better lower, `_per_s`
+better higher. Every benchmark also checks that the work it timed came out
+right (the journal drained, the menu ended up in the right state...) and
+raises BenchmarkError if not, so a fast but broken build can't pass.
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from bench import fakes, harness, headless
+
+COLD_START_RUNS = 5
+# A round trip to Google as the fakes play it during cold start.
+COLD_START_GOOGLE_LATENCY = 0.05
+COLD_START_HISTORY_EVENTS = 5000
+ACTION_ROUNDS = 200
+TICK_CALLS = 20000
+MENU_UPDATE_CALLS = 5000
+SYNC_SEGMENTS = 2000
+SYNC_BATCH_LATENCY = 0.01
+MIRROR_REMOTE_EVENTS = 5000
+MIRROR_PAGE_LATENCY = 0.01
+# The task input's budget: under 1ms per keystroke over 100k past entries.
+INDEX_EVENTS = 100000
+INDEX_TASKS = 100000
+SUGGEST_TARGET_MS = 1.0
+SUGGEST_QUERIES = ('', 'd', 'de', 'des', 'design', 'r', 're', 'api 1', 'te do', 'x', 'meeting sync', 'zzz',
+                   'view', 'desgin', 'zzzz')
+SUGGEST_ROUNDS = 200
+EXPORT_EVENTS = 20000
+EXPORT_PAGE_LATENCY = 0.01
+
+
+class BenchmarkError(Exception):
+    """The code under test misbehaved, so its timings mean nothing."""
+
+
+def _check(condition, message):
+    if not condition:
+        raise BenchmarkError(message)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _new_directory(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.chdir(path)
+
+
+def _launch_app(directory):
+    """A signed-in MenuApp on the headless run loop, backed by a fake Calendar."""
+    _new_directory(directory)
+    menu_app = harness.launch_app()
+    if menu_app.menu_state() != 'idle':
+        harness.close_app(menu_app)
+        raise BenchmarkError(f"app did not sign in, menu is {menu_app.menu_state()}")
+    return menu_app
+
+
+def cold_start(directory):
+    """Median time to the menu bar icon, to signed in and to a clean exit, over fresh interpreters."""
+    template = os.path.join(directory, 'template')
+    _new_directory(template)
+    from history import HistoryStore
+    history = HistoryStore('history.sqlite3')
+    harness.seed_history(history, COLD_START_HISTORY_EVENTS)
+    history.close()
+
+    runs = []
+    for n in range(COLD_START_RUNS):
+        run_directory = os.path.join(directory, f'run{n}')
+        shutil.rmtree(run_directory, ignore_errors=True)
+        shutil.copytree(template, run_directory)
+        launched = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-m', 'bench.cold_start', run_directory, str(COLD_START_GOOGLE_LATENCY)],
+            cwd=harness.REPO_ROOT, capture_output=True, text=True, timeout=120,
+        )
+        wall = time.perf_counter() - launched
+        _check(result.returncode == 0, f"cold start run failed:\n{result.stderr}")
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        _check(timings.get('signed_in') and 'ready' in timings, f"cold start never got ready: {timings}")
+        _check(timings['menu'][-1] == 'Quit' and '⏵' in timings['menu'], f"wrong menu after launch: {timings['menu']}")
+        runs.append((timings['icon'], timings['ready'], wall))
+    icon, ready, wall = (statistics.median(column) for column in zip(*runs))
+    return {
+        'cold_start.time_to_icon_ms': _ms(icon),
+        'cold_start.time_to_ready_ms': _ms(ready),
+        'cold_start.launch_to_exit_ms': _ms(wall),
+    }
+
+
+def actions(directory):
+    """Latency of the start/pause/resume/stop handlers as the menu calls them."""
+    menu_app = _launch_app(directory)
+    samples = {'start': [], 'pause': [], 'resume': [], 'stop': []}
+    names = harness.task_names(10)
+    try:
+        for n in range(ACTION_ROUNDS):
+            for step, call in (('start', lambda: menu_app.start_event(None, names[n % len(names)])),
+                               ('pause', lambda: menu_app.pause_event(None)),
+                               ('resume', lambda: menu_app.start_event(None)),
+                               ('stop', lambda: menu_app.stop_event(None))):
+                began = time.perf_counter()
+                call()
+                samples[step].append(time.perf_counter() - began)
+                headless.run_pending()
+                expected = {'start': 'running', 'pause': 'paused', 'resume': 'running', 'stop': 'idle'}[step]
+                _check(menu_app.shown_menu_state == expected,
+                       f"after {step} the menu shows {menu_app.shown_menu_state}, not {expected}")
+        _check(not headless.alerts, f"actions raised alerts: {headless.alerts[:3]}")
+        # Each round journals one event: the resume extends the paused one.
+        _check(len(menu_app.core.history.event_ids()) + len(menu_app.core.journal) >= ACTION_ROUNDS // 2,
+               "segments went missing")
+    finally:
+        harness.close_app(menu_app)
+    results = {}
+    for step, times in samples.items():
+        results[f'actions.{step}_p50_ms'] = _ms(_percentile(times, 0.5))
+        results[f'actions.{step}_p95_ms'] = _ms(_percentile(times, 0.95))
+    return results
+
+
+def tick(directory):
+    """What a title tick and a no-change menu refresh cost while a task runs."""
+    menu_app = _launch_app(directory)
+    try:
+        menu_app.start_event(None, 'bench tick')
+        headless.run_pending()
+        began = time.perf_counter()
+        for n in range(TICK_CALLS):
+            menu_app.on_title_tick(menu_app.title_tick_generation)
+        tick_seconds = (time.perf_counter() - began) / TICK_CALLS
+        _check(menu_app.title.startswith('bench tick • for'), f"unexpected title {menu_app.title!r}")
+        _check(headless.pending() >= 1, "no title tick was scheduled")
+        headless.reset()
+
+        began = time.perf_counter()
+        for n in range(MENU_UPDATE_CALLS):
+            menu_app.update_button_states()
+        update_seconds = (time.perf_counter() - began) / MENU_UPDATE_CALLS
+        headless.reset()
+    finally:
+        harness.close_app(menu_app)
+    return {
+        'tick.title_tick_us': round(tick_seconds * 1e6, 3),
+        'tick.menu_update_us': round(update_seconds * 1e6, 3),
+    }
+
+
+def sync(directory):
+    """Journal replay, flushing a large backlog in batches, and mirroring a large calendar."""
+    _new_directory(directory)
+    from core import ClockInCore, JOURNAL_FILE
+    from journal import SessionJournal
+    events = harness.seed_journal(JOURNAL_FILE, SYNC_SEGMENTS)
+
+    began = time.perf_counter()
+    SessionJournal(JOURNAL_FILE).close()
+    replay_seconds = time.perf_counter() - began
+
+    core = ClockInCore()
+    try:
+        plan = fakes.FaultPlan(latency=SYNC_BATCH_LATENCY)
+        service, calendar_id = fakes.connect_core(core, fakes.FakeCalendarService(plan))
+        pending = len(core.journal)
+        _check(pending == events, f"journal replayed {pending} event(s), expected {events}")
+        began = time.perf_counter()
+        done = core.sync_worker.flush()
+        flush_seconds = time.perf_counter() - began
+        _check(done and len(core.journal) == 0, f"{len(core.journal)} segment(s) left after the flush")
+        _check(len(service.events_in(calendar_id)) == events, "Calendar is missing events after the flush")
+
+        # Pad the calendar with events made elsewhere, then pull it all down.
+        for n in range(MIRROR_REMOTE_EVENTS - events):
+            start = time.time() - (n + 1) * 7200
+            service.put_event(calendar_id, {
+                'id': f'remote{n:08d}', 'summary': f'remote task {n % 97}',
+                'start': {'dateTime': fakes.rfc3339(start)}, 'end': {'dateTime': fakes.rfc3339(start + 1800)},
+            })
+        plan.latency = MIRROR_PAGE_LATENCY
+        began = time.perf_counter()
+        core.mirror.sync(service, calendar_id)
+        full_seconds = time.perf_counter() - began
+        _check(len(core.history.event_ids()) == MIRROR_REMOTE_EVENTS, "the full pull missed events")
+
+        for event_id in list(service.events_in(calendar_id))[:10]:
+            service.cancel_event(calendar_id, event_id)
+        began = time.perf_counter()
+        changed = core.mirror.sync(service, calendar_id)
+        incremental_seconds = time.perf_counter() - began
+        _check(changed == 10, f"the incremental pull saw {changed} change(s), expected 10")
+    finally:
+        core.close()
+    return {
+        'sync.journal_replay_ms': _ms(replay_seconds),
+        'sync.flush_segments_per_s': round(SYNC_SEGMENTS / flush_seconds, 1),
+        'sync.mirror_full_events_per_s': round(MIRROR_REMOTE_EVENTS / full_seconds, 1),
+        'sync.mirror_incremental_ms': _ms(incremental_seconds),
+    }
+
+
+def task_index(directory):
+    """Loading past tasks into the autocomplete index, and answering keystrokes."""
+    _new_directory(directory)
+    from history import HistoryStore
+    from task_index import TaskIndex
+    history = HistoryStore('history.sqlite3')
+    try:
+        harness.seed_history(history, INDEX_EVENTS, tasks=INDEX_TASKS)
+        uses = history.task_uses(time.time())
+    finally:
+        history.close()
+    index = TaskIndex()
+    began = time.perf_counter()
+    index.load(uses)
+    load_seconds = time.perf_counter() - began
+    tasks = len({summary for summary, _ in uses})
+    _check(len(index) == tasks, f"index holds {len(index)} task(s), expected {tasks}")
+
+    samples = []
+    for n in range(SUGGEST_ROUNDS):
+        for query in SUGGEST_QUERIES:
+            began = time.perf_counter()
+            suggestions = index.suggest(query)
+            samples.append(time.perf_counter() - began)
+            if n == 0 and query == 'des':
+                _check(suggestions and all('des' in s for s in suggestions), f"bad suggestions {suggestions}")
+    p95 = _percentile(samples, 0.95)
+    _check(p95 * 1000 < SUGGEST_TARGET_MS, f"suggest p95 is {_ms(p95)}ms, over the {SUGGEST_TARGET_MS}ms budget")
+    return {
+        'task_index.load_ms': _ms(load_seconds),
+        'task_index.suggest_p50_us': round(_percentile(samples, 0.5) * 1e6, 3),
+        'task_index.suggest_p95_us': round(p95 * 1e6, 3),
+    }
+
+
+def export_sessions(directory):
+    """Streaming a large export to CSV from Google Calendar and from the local history."""
+    _new_directory(directory)
+    import export
+    from history import HistoryStore
+    service = fakes.FakeCalendarService()
+    calendar_id = service.add_calendar()
+    start = time.time() - EXPORT_EVENTS * 3600
+    for n in range(EXPORT_EVENTS):
+        service.put_event(calendar_id, {
+            'id': f'export{n:08d}', 'summary': f'task {n % 50}',
+            'start': {'dateTime': fakes.rfc3339(start + n * 3600)},
+            'end': {'dateTime': fakes.rfc3339(start + n * 3600 + 1800)},
+        })
+    service.plan.latency = EXPORT_PAGE_LATENCY
+    began = time.perf_counter()
+    count = export.export_to_file(export.calendar_events(service, calendar_id), 'csv', 'calendar.csv')
+    calendar_seconds = time.perf_counter() - began
+    _check(count == EXPORT_EVENTS, f"exported {count} of {EXPORT_EVENTS} calendar events")
+
+    history = HistoryStore('history.sqlite3')
+    try:
+        harness.seed_history(history, EXPORT_EVENTS)
+        began = time.perf_counter()
+        count = export.export_to_file(history.segments(), 'csv', 'history.csv')
+        history_seconds = time.perf_counter() - began
+    finally:
+        history.close()
+    _check(count == EXPORT_EVENTS, f"exported {count} of {EXPORT_EVENTS} history events")
+    return {
+        'export.calendar_events_per_s': round(EXPORT_EVENTS / calendar_seconds, 1),
+        'export.history_events_per_s': round(EXPORT_EVENTS / history_seconds, 1),
+    }
+
+
+BENCHMARKS = {
+    'cold_start': cold_start,
+    'actions': actions,
+    'tick': tick,
+    'sync': sync,
+    'task_index': task_index,
+    'export': export_sessions,
+}
@@ -0,0 +1,36 @@
+"""One headless launch of the menu bar app, for the cold-start benchmark.
+
+    python -m bench.cold_start <scratch directory> <google latency seconds>
+
+Runs in its own interpreter so imports are cold. The app signs in through
+the fake Calendar service, and the runner loop stands in for Cocoa's until
+the app reports 'ready'. Prints the app's startup timings as JSON.
+"""
+import json
+import sys
+import time
+
+READY_TIMEOUT_SECONDS = 30
+
+
+def main():
+    directory, latency = sys.argv[1], float(sys.argv[2])
+    from bench import fakes, harness, headless
+    harness.prepare(directory)
+    harness.patch_google(fakes.FakeCalendarService(fakes.FaultPlan(latency=latency)))
+
+    import app
+    menu_app = app.MenuApp()
+    deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+    while 'ready' not in menu_app.startup_timings and time.monotonic() < deadline:
+        headless.run_pending(timeout=0.005)
+    timings = dict(menu_app.startup_timings, signed_in=bool(menu_app.core.credentials),
+                   menu=headless.visible_items(menu_app))
+    if menu_app.control_server:
+        menu_app.control_server.stop()
+    menu_app.core.close()
+    print(json.dumps(timings))
+
+
+if __name__ == '__main__':
+    main()
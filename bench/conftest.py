@@ -0,0 +1,27 @@
+import tempfile
+
+import pytest
+
+from bench import harness, headless
+
+# Before any test module imports core, control or app.
+SCRATCH = tempfile.mkdtemp(prefix='clockin-tests-')
+PRESENCE_LOG = harness.prepare(SCRATCH)
+
+
+@pytest.fixture(autouse=True)
+def scratch(tmp_path, monkeypatch):
+    # The core keeps its journal, history and caches in the working directory.
+    monkeypatch.chdir(tmp_path)
+    headless.reset()
+    PRESENCE_LOG.clear()
+    yield tmp_path
+    headless.reset()
+
+
+@pytest.fixture
+def core():
+    from core import ClockInCore
+    clockin_core = ClockInCore()
+    yield clockin_core
+    clockin_core.close()
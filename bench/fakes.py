@@ -0,0 +1,360 @@
+"""In-process stand-ins for Google Calendar, Google OAuth and Discord.
+
+Each fake covers only the API surface cLockIn calls. A FaultPlan injects
+latency and failures into it. Nothing here touches the network.
+"""
+import asyncio
+import datetime
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+import types
+
+
+class FakeHttpError(Exception):
+    """Looks like googleapiclient's HttpError to calendar_sync.http_status()."""
+
+    def __init__(self, status, reason=''):
+        super().__init__(f"HTTP {status} {reason}".strip())
+        self.resp = types.SimpleNamespace(status=status, reason=reason)
+        self.status_code = status
+
+
+class FaultPlan:
+    """Latency and failures to inject into every call a fake makes.
+
+    latency/jitter: seconds added to each round trip.
+    failure_rate: chance that a round trip fails with failure_status.
+    fail_next: the next N round trips fail, whatever the rate.
+    item_failure_rate: chance that one request inside a batch fails on its own.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, failure_status=503, fail_next=0,
+                 item_failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.fail_next = fail_next
+        self.item_failure_rate = item_failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._random.random() * self.jitter if self.jitter else 0.0)
+            fail = self.fail_next > 0 or (self.failure_rate and self._random.random() < self.failure_rate)
+            if self.fail_next > 0:
+                self.fail_next -= 1
+        return delay, fail
+
+    def round_trip(self):
+        delay, fail = self._delay()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeHttpError(self.failure_status, 'injected')
+
+    async def round_trip_async(self):
+        delay, fail = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise ConnectionError("injected failure")
+
+    def item_fails(self):
+        with self._lock:
+            return bool(self.item_failure_rate) and self._random.random() < self.item_failure_rate
+
+
+# Google Calendar
+
+def rfc3339(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+class _Request:
+    def __init__(self, service, run):
+        self._service = service
+        self._run = run
+
+    def execute(self):
+        self._service.plan.round_trip()
+        with self._service.lock:
+            return self._run()
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id=None):
+        self._requests.append((request_id, request))
+
+    def execute(self):
+        # One round trip for the whole batch, then a response per request.
+        self._service.plan.round_trip()
+        self._service.batches += 1
+        for request_id, request in self._requests:
+            try:
+                if self._service.plan.item_fails():
+                    raise FakeHttpError(503, 'injected')
+                with self._service.lock:
+                    response = request._run()
+            except FakeHttpError as e:
+                self._callback(request_id, None, e)
+            else:
+                self._callback(request_id, response, None)
+
+
+class _Resource:
+    def __init__(self, service, **methods):
+        self._service = service
+        self._methods = methods
+
+    def __getattr__(self, name):
+        method = self._methods[name]
+        return lambda **kwargs: _Request(self._service, lambda: method(**kwargs))
+
+
+class FakeCalendarService:
+    """A Calendar v3 service object backed by dicts.
+
+    Events are stored as Calendar returns them: 'start'/'end' hold RFC 3339
+    'dateTime' strings. Every change is numbered so events().list can serve
+    syncToken deltas. expire_sync_tokens() makes old tokens answer 410 Gone.
+    """
+
+    def __init__(self, plan=None):
+        self.plan = plan or FaultPlan()
+        self.lock = threading.Lock()
+        self._calendars = {}  # calendar id -> {'summary': ..., 'events': {event id: event}}
+        self.batches = 0
+        self._sequence = itertools.count(1)
+        self._changes = {}  # (calendar id, event id) -> sequence of its last change
+        self._oldest_valid_token = 0
+        self._calendar_ids = (f'calendar{n}@group.calendar.google.com' for n in itertools.count(1))
+
+    # Test helpers
+
+    def add_calendar(self, summary='cLockIn'):
+        calendar_id = next(self._calendar_ids)
+        self._calendars[calendar_id] = {'summary': summary, 'events': {}}
+        return calendar_id
+
+    def events_in(self, calendar_id):
+        return {event_id: event for event_id, event in self._calendars[calendar_id]['events'].items()
+                if event.get('status') != 'cancelled'}
+
+    def put_event(self, calendar_id, event):
+        """Creates or replaces an event as if it was edited in Google Calendar."""
+        with self.lock:
+            self._store(calendar_id, dict(event))
+
+    def cancel_event(self, calendar_id, event_id):
+        with self.lock:
+            event = self._calendar(calendar_id)['events'][event_id]
+            self._store(calendar_id, {'id': event_id, 'status': 'cancelled', 'summary': event.get('summary')})
+
+    def expire_sync_tokens(self):
+        self._oldest_valid_token = next(self._sequence)
+
+    # Service surface
+
+    def events(self):
+        return _Resource(self, insert=self._insert_event, patch=self._patch_event, list=self._list_events,
+                         get=self._get_event)
+
+    def calendars(self):
+        return _Resource(self, get=self._get_calendar, insert=self._insert_calendar)
+
+    def calendarList(self):
+        return _Resource(self, list=self._list_calendars)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+    # Implementation
+
+    def _calendar(self, calendar_id):
+        if calendar_id not in self._calendars:
+            raise FakeHttpError(404, 'Not Found')
+        return self._calendars[calendar_id]
+
+    def _store(self, calendar_id, event):
+        event.setdefault('status', 'confirmed')
+        self._calendar(calendar_id)['events'][event['id']] = event
+        self._changes[(calendar_id, event['id'])] = next(self._sequence)
+
+    def _insert_event(self, calendarId, body, fields=None):
+        events = self._calendar(calendarId)['events']
+        if body.get('id') in events:
+            raise FakeHttpError(409, 'duplicate')
+        event = dict(body)
+        event.setdefault('id', f'e{next(self._sequence)}')
+        self._store(calendarId, event)
+        return {'id': event['id']}
+
+    def _patch_event(self, calendarId, eventId, body, fields=None):
+        events = self._calendar(calendarId)['events']
+        if eventId not in events or events[eventId].get('status') == 'cancelled':
+            raise FakeHttpError(404, 'Not Found')
+        self._store(calendarId, dict(events[eventId], **body))
+        return {'id': eventId}
+
+    def _get_event(self, calendarId, eventId, fields=None):
+        events = self._calendar(calendarId)['events']
+        if eventId not in events:
+            raise FakeHttpError(404, 'Not Found')
+        return dict(events[eventId])
+
+    def _list_events(self, calendarId, maxResults=250, pageToken=None, syncToken=None, fields=None,
+                     timeMin=None, timeMax=None, singleEvents=None, orderBy=None, showDeleted=None):
+        calendar = self._calendar(calendarId)
+        if syncToken is not None:
+            if int(syncToken) < self._oldest_valid_token:
+                raise FakeHttpError(410, 'Gone')
+            # Deltas include cancellations.
+            items = [event for event_id, event in calendar['events'].items()
+                     if self._changes[(calendarId, event_id)] > int(syncToken)]
+        else:
+            items = [event for event in calendar['events'].values() if event.get('status') != 'cancelled']
+            if timeMin:
+                items = [event for event in items if event['end']['dateTime'] > timeMin]
+            if timeMax:
+                items = [event for event in items if event['start']['dateTime'] < timeMax]
+            items.sort(key=lambda event: event['start']['dateTime'])
+        offset = int(pageToken or 0)
+        page = {'items': [dict(event) for event in items[offset:offset + maxResults]]}
+        if offset + maxResults < len(items):
+            page['nextPageToken'] = str(offset + maxResults)
+        else:
+            page['nextSyncToken'] = str(max(self._changes.values(), default=0))
+        return page
+
+    def _get_calendar(self, calendarId, fields=None):
+        return {'id': calendarId, 'summary': self._calendar(calendarId)['summary']}
+
+    def _insert_calendar(self, body, fields=None):
+        calendar_id = self.add_calendar(body['summary'])
+        return {'id': calendar_id}
+
+    def _list_calendars(self, minAccessRole=None, maxResults=250, pageToken=None, fields=None):
+        items = [{'id': calendar_id, 'summary': calendar['summary']}
+                 for calendar_id, calendar in self._calendars.items()]
+        offset = int(pageToken or 0)
+        page = {'items': items[offset:offset + maxResults]}
+        if offset + maxResults < len(items):
+            page['nextPageToken'] = str(offset + maxResults)
+        return page
+
+
+# Google OAuth
+
+def _utcnow():
+    # google-auth keeps expiry as a naive UTC datetime.
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class FakeCredentials:
+    """Enough of google.oauth2.credentials.Credentials for the core and TokenRefresher."""
+
+    def __init__(self, plan=None, lifetime=3600, email='bench@example.com'):
+        self.plan = plan or FaultPlan()
+        self.lifetime = lifetime
+        self.email = email
+        self.token = None
+        self.expiry = None
+        self.refresh_token = 'fake-refresh-token'
+        self.id_token = None
+        self.client_id = 'fake-client-id'
+        self.refreshes = 0
+        self.refresh(None)
+
+    @property
+    def valid(self):
+        return self.token is not None and _utcnow() < self.expiry
+
+    @property
+    def expired(self):
+        return not self.valid
+
+    def refresh(self, request):
+        if self.refreshes:
+            self.plan.round_trip()
+        self.refreshes += 1
+        self.token = f'fake-access-token-{self.refreshes}'
+        self.expiry = _utcnow() + datetime.timedelta(seconds=self.lifetime)
+
+    def to_json(self):
+        return json.dumps({'token': self.token, 'refresh_token': self.refresh_token, 'client_id': self.client_id})
+
+
+class FakeHttp:
+    """Stands in for transport.SessionHttp, which the token refresher calls."""
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+
+    def refresh(self, force=False, stale_token=None):
+        if stale_token is None or self.credentials.token == stale_token:
+            self.credentials.refresh(None)
+
+
+# Discord
+
+class FakeAioPresence:
+    """pypresence.AioPresence without a Discord client. Every call is recorded in `log`."""
+
+    log = []
+    plan = FaultPlan()
+
+    def __init__(self, client_id, loop=None):
+        self.client_id = client_id
+        self.sock_writer = None
+
+    async def connect(self):
+        await self.plan.round_trip_async()
+        self.log.append(('connect', None))
+
+    async def update(self, **activity):
+        await self.plan.round_trip_async()
+        self.log.append(('update', activity))
+
+    async def clear(self, pid=None):
+        await self.plan.round_trip_async()
+        self.log.append(('clear', None))
+
+    def close(self):
+        pass
+
+
+def install_fake_pypresence(plan=None):
+    """Makes `import pypresence` return the fake; returns its call log."""
+    FakeAioPresence.plan = plan or FaultPlan()
+    FakeAioPresence.log.clear()
+    module = types.ModuleType('pypresence')
+    module.AioPresence = FakeAioPresence
+    sys.modules['pypresence'] = module
+    return FakeAioPresence.log
+
+
+def connect_core(core, service=None, calendar_summary='cLockIn'):
+    """Signs `core` in against a fake service, skipping OAuth and the token refresher."""
+    service = service or FakeCalendarService()
+    calendar_id = service.add_calendar(calendar_summary)
+    with core._lock:
+        core.credentials = FakeCredentials()
+        core.calendar_service = service
+        core.user_email = core.credentials.email
+        core.calendar_id = calendar_id
+        core.connecting = False
+    core.sync_worker.wake(mirror=True)
+    return service, calendar_id
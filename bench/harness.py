@@ -0,0 +1,129 @@
+"""Shared setup for the benchmarks and regression tests.
+
+prepare() has to run before anything imports app, since that needs the
+headless rumps and fake pypresence installed first. It also points every
+file cLockIn writes at a scratch directory.
+"""
+import os
+import random
+import sys
+import time
+
+from bench import fakes, headless
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DISCORD_CLIENT_ID = 'bench-discord-client'
+TASK_WORDS = ('design', 'review', 'write', 'debug', 'plan', 'email', 'research', 'deploy', 'test', 'refactor',
+              'docs', 'meeting', 'sync', 'api', 'client', 'server', 'mobile', 'release', 'budget', 'hiring')
+
+
+def prepare(directory, discord_plan=None):
+    """Makes `directory` the working directory and wires up the stand-ins; returns the pypresence call log."""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    os.environ['CLOCKIN_SOCKET'] = os.path.join(directory, 'clockin.sock')
+    os.environ['CLOCKIN_METRICS_FILE'] = os.path.join(directory, 'metrics.json')
+    os.environ['CLOCKIN_LOG_FILE'] = os.path.join(directory, 'clockin.log')
+    os.environ['DISCORD_APP_CLIENT_ID'] = DISCORD_CLIENT_ID
+    for name in ('CLOCKIN_WEBHOOK_URL', 'CLOCKIN_EXPORT_FILE', 'CLOCKIN_STARTUP_BENCHMARK'):
+        os.environ.pop(name, None)
+    headless.install()
+    return fakes.install_fake_pypresence(discord_plan)
+
+
+def task_names(count, seed=0):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(' '.join(rng.sample(TASK_WORDS, rng.randint(1, 3))) + f' {rng.randint(1, 999)}')
+    return sorted(names)
+
+
+def seed_history(history, events, tasks=200, days=90, seed=0):
+    """Fills a HistoryStore with `events` past segments spread over `days`."""
+    rng = random.Random(seed)
+    names = task_names(tasks, seed)
+    now = time.time()
+    upserts = []
+    for n in range(events):
+        start = now - rng.uniform(3600, days * 86400)
+        upserts.append((f'seed{n:08d}', rng.choice(names), start, start + rng.uniform(300, 7200)))
+    history.apply_changes(upserts, [])
+
+
+def seed_journal(path, segments, extend_every=4, seed=0):
+    """Writes a journal holding `segments` unsynced segments; every `extend_every`-th one extends the last event.
+
+    Returns how many distinct events that is.
+    """
+    import json
+    from journal import new_event_id
+    rng = random.Random(seed)
+    names = task_names(50, seed)
+    start = time.time() - segments * 3600
+    event_id = None
+    events = 0
+    with open(path, 'w') as journal_file:
+        for n in range(segments):
+            end = start + rng.uniform(300, 3000)
+            if event_id and extend_every and n % extend_every == 0:
+                record = {'op': 'extend', 'id': event_id, 'end': end}
+            else:
+                event_id = new_event_id()
+                events += 1
+                record = {'op': 'insert', 'id': event_id,
+                          'segment': {'summary': rng.choice(names), 'start': start, 'end': end}}
+            journal_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            start = end + 60
+    return events
+
+
+def patch_google(service, credentials_plan=None):
+    """Routes the core's Google sign-in through `service` and FakeCredentials instead of OAuth.
+
+    Returns a function that puts the real ones back.
+    """
+    import core
+    originals = (core.build_service, core.shared_http, core.ClockInCore.load_credentials)
+    core.build_service = lambda name, version, credentials: service
+    core.shared_http = fakes.FakeHttp
+    core.ClockInCore.load_credentials = lambda self: self.connect(
+        fakes.FakeCredentials(credentials_plan), 'bench@example.com')
+
+    def restore():
+        core.build_service, core.shared_http, core.ClockInCore.load_credentials = originals
+    return restore
+
+
+def launch_app(latency=0.0, timeout=10):
+    """Starts MenuApp against a fake Calendar and runs the headless loop until it is ready.
+
+    close_app() undoes the Google patches, so pair every launch with it.
+    """
+    service = fakes.FakeCalendarService(fakes.FaultPlan(latency=latency))
+    restore_google = patch_google(service)
+    try:
+        import app
+        headless.reset()
+        menu_app = app.MenuApp()
+    except BaseException:
+        restore_google()
+        raise
+    menu_app.restore_google = restore_google
+    deadline = time.monotonic() + timeout
+    while 'ready' not in menu_app.startup_timings and time.monotonic() < deadline:
+        headless.run_pending(timeout=0.005)
+    return menu_app
+
+
+def close_app(menu_app):
+    if menu_app.control_server:
+        menu_app.control_server.stop()
+    menu_app.core.close()
+    # Apps built without launch_app() have no Google patches to undo.
+    restore_google = getattr(menu_app, 'restore_google', None)
+    if restore_google:
+        restore_google()
+    headless.reset()
@@ -0,0 +1,153 @@
+"""A headless stand-in for rumps, AppKit and PyObjCTools.AppHelper.
+
+install() registers these modules in sys.modules so app.py imports and
+MenuApp runs on Linux with no window server. Menu items keep the state
+that rumps would push to Cocoa (title, callback, state, hidden). Work
+scheduled with AppHelper.callAfter/callLater waits on a queue until
+run_pending() runs it, which stands in for the main run loop.
+"""
+import heapq
+import itertools
+import sys
+import threading
+import time
+import types
+
+notifications = []
+alerts = []
+
+_lock = threading.Lock()
+_scheduled = []  # heap of (due, sequence, function, args)
+_sequence = itertools.count()
+
+
+def _call_later(delay, function, *args):
+    with _lock:
+        heapq.heappush(_scheduled, (time.monotonic() + delay, next(_sequence), function, args))
+
+
+def _call_after(function, *args):
+    _call_later(0, function, *args)
+
+
+def run_pending(timeout=0.0):
+    """Runs every callback that is due, waiting up to `timeout` for more to arrive."""
+    deadline = time.monotonic() + timeout
+    ran = 0
+    while True:
+        with _lock:
+            due = _scheduled[0][0] if _scheduled else None
+            if due is not None and due <= time.monotonic():
+                _, _, function, args = heapq.heappop(_scheduled)
+            else:
+                function = None
+        if function is not None:
+            function(*args)
+            ran += 1
+            continue
+        if time.monotonic() >= deadline:
+            return ran
+        time.sleep(0.001)
+
+
+def pending():
+    with _lock:
+        return len(_scheduled)
+
+
+def reset():
+    with _lock:
+        _scheduled.clear()
+    notifications.clear()
+    alerts.clear()
+
+
+class Menu(dict):
+    _separators = itertools.count()
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            super().__setitem__(key, value)
+
+    def add(self, item):
+        if item is None:
+            self[f'separator_{next(self._separators)}'] = None
+        else:
+            self[item.title] = item
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+
+class MenuItem(Menu):
+    def __init__(self, title, callback=None, key=None, icon=None):
+        super().__init__()
+        self.title = title
+        self.callback = callback
+        self.state = 0
+        self.hidden = False
+
+    def set_callback(self, callback, key=None):
+        self.callback = callback
+
+    def hide(self):
+        self.hidden = True
+
+    def show(self):
+        self.hidden = False
+
+    def __hash__(self):
+        return id(self)
+
+    def __eq__(self, other):
+        return self is other
+
+
+class App:
+    def __init__(self, name, title=None, icon=None, quit_button='Quit', **kwargs):
+        self.name = name
+        self.title = title
+        self.icon = icon
+        self._menu = Menu()
+
+    @property
+    def menu(self):
+        return self._menu
+
+    @menu.setter
+    def menu(self, items):
+        self._menu.update(items)
+
+    def run(self):
+        raise RuntimeError("The headless app has no run loop; call headless.run_pending() instead")
+
+
+def visible_items(app):
+    """Titles of the visible, non-separator items in the app's top-level menu."""
+    return [item.title for item in app.menu.values() if item is not None and not item.hidden]
+
+
+def install():
+    rumps = types.ModuleType('rumps')
+    rumps.App = App
+    rumps.MenuItem = MenuItem
+    rumps.separator = None
+    rumps.notification = lambda title, subtitle, message, **kwargs: notifications.append((title, subtitle, message))
+    rumps.alert = lambda title=None, message='', **kwargs: alerts.append((title, message))
+    rumps.quit_application = lambda sender=None: None
+    sys.modules['rumps'] = rumps
+
+    app_helper = types.ModuleType('PyObjCTools.AppHelper')
+    app_helper.callAfter = _call_after
+    app_helper.callLater = _call_later
+    py_objc_tools = types.ModuleType('PyObjCTools')
+    py_objc_tools.AppHelper = app_helper
+    sys.modules['PyObjCTools'] = py_objc_tools
+    sys.modules['PyObjCTools.AppHelper'] = app_helper
+
+    app_kit = types.ModuleType('AppKit')
+    shared_application = types.SimpleNamespace(setActivationPolicy_=lambda policy: None)
+    app_kit.NSApplication = types.SimpleNamespace(sharedApplication=lambda: shared_application)
+    app_kit.NSApplicationActivationPolicyAccessory = 1
+    sys.modules['AppKit'] = app_kit
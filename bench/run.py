@@ -0,0 +1,119 @@
+"""Runs the benchmarks and compares them with the stored baselines.
+
+    python -m bench.run [--only NAME ...] [--update-baselines] [--json PATH]
+
+Exits 1 when a metric is worse than its baseline by more than the
+baseline's tolerance (a fraction: 1.0 allows twice as slow, or half the
+throughput), or when a benchmark's own correctness checks fail.
+--update-baselines records this run as the new baselines and keeps each
+metric's tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+DEFAULT_TOLERANCE = 1.0
+# Tail latencies and microsecond timings are noisier, so new ones get more room.
+NOISY_TOLERANCE = 2.0
+
+
+def unit(metric):
+    if metric.endswith('_per_s'):
+        return metric[:-len('_per_s')].rsplit('_', 1)[-1] + '/s'
+    return metric.rsplit('_', 1)[-1]
+
+
+def higher_is_better(metric):
+    return metric.endswith('_per_s')
+
+
+def default_tolerance(metric):
+    return NOISY_TOLERANCE if metric.endswith(('_p95_ms', '_us')) else DEFAULT_TOLERANCE
+
+
+def compare(results, baselines):
+    """Returns [(metric, value, baseline, change, regressed)]; change is the fraction worse (negative is better)."""
+    rows = []
+    for metric, value in results.items():
+        baseline = baselines.get(metric)
+        if baseline is None:
+            rows.append((metric, value, None, None, False))
+            continue
+        if higher_is_better(metric):
+            change = baseline['value'] / value - 1 if value else float('inf')
+        else:
+            change = value / baseline['value'] - 1 if baseline['value'] else 0.0
+        rows.append((metric, value, baseline['value'], change, change > baseline.get('tolerance', default_tolerance(metric))))
+    return rows
+
+
+def updated_baselines(results, baselines):
+    return {metric: {'value': value, 'unit': unit(metric),
+                     'tolerance': baselines.get(metric, {}).get('tolerance', default_tolerance(metric))}
+            for metric, value in sorted(dict({metric: baseline['value'] for metric, baseline in baselines.items()},
+                                             **results).items())}
+
+
+def main():
+    from bench import benchmarks, harness
+
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--only', nargs='+', choices=benchmarks.BENCHMARKS, help="run just these benchmarks")
+    arg_parser.add_argument('--update-baselines', action='store_true', help="store this run as the baselines")
+    arg_parser.add_argument('--baselines', default=BASELINES_FILE, help="baselines file to compare with")
+    arg_parser.add_argument('--json', help="also write the results to this file")
+    args = arg_parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as baselines_file:
+            baselines = json.load(baselines_file)
+
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory(prefix='clockin-bench-') as scratch:
+        harness.prepare(scratch)
+        for name in args.only or benchmarks.BENCHMARKS:
+            print(f"Running {name}...", file=sys.stderr)
+            try:
+                results.update(benchmarks.BENCHMARKS[name](os.path.join(scratch, name)))
+            except benchmarks.BenchmarkError as e:
+                failures.append(f"{name}: {e}")
+            except ImportError as e:
+                failures.append(f"{name}: needs {e.name} installed")
+            os.chdir(scratch)
+        os.chdir(harness.REPO_ROOT)
+
+    rows = compare(results, baselines)
+    print(f"{'metric':<36} {'value':>12} {'baseline':>12} {'change':>8}")
+    for metric, value, baseline, change, regressed in rows:
+        shown_baseline = f"{baseline:12.3f}" if baseline is not None else f"{'-':>12}"
+        shown_change = f"{change:+8.0%}" if change is not None else f"{'new':>8}"
+        print(f"{metric:<36} {value:12.3f} {shown_baseline} {shown_change}  {unit(metric)}"
+              + ("  REGRESSED" if regressed else ""))
+    for failure in failures:
+        print(f"FAILED {failure}")
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+    if args.update_baselines:
+        if failures:
+            raise SystemExit("Not updating baselines while benchmarks fail")
+        with open(args.baselines, 'w') as baselines_file:
+            json.dump(updated_baselines(results, baselines), baselines_file, indent=2)
+            baselines_file.write('\n')
+        print(f"Baselines written to {args.baselines}")
+        return
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed: {', '.join(regressions)}")
+    if regressions or failures:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,685 @@
+"""Regression tests for sync, mirroring, presence, the control socket and the menu, all against fakes."""
+import datetime
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from bench import fakes, harness, headless
+from bench.conftest import PRESENCE_LOG
+
+
+def _end(event):
+    return datetime.datetime.fromisoformat(event['end']['dateTime']).timestamp()
+
+
+def _flush_until_done(core, attempts=20):
+    for _ in range(attempts):
+        try:
+            if core.sync_worker.flush():
+                return True
+        except fakes.FakeHttpError:
+            # A whole batch failed; the worker would retry later.
+            pass
+    return False
+
+
+def _run_until(condition, timeout=5):
+    # Runs the headless main loop, as Cocoa would, until `condition` holds.
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        headless.run_pending(timeout=0.005)
+    return condition()
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+# Calendar sync
+
+def test_flush_converges_under_injected_failures():
+    from core import ClockInCore, JOURNAL_FILE
+    harness.seed_journal(JOURNAL_FILE, 300)
+    core = ClockInCore()
+    try:
+        expected = {event_id: segment['end'] for event_id, _, segment in core.journal.pending()}
+        plan = fakes.FaultPlan(fail_next=2, item_failure_rate=0.2, seed=7)
+        service, calendar_id = fakes.connect_core(core, fakes.FakeCalendarService(plan))
+        assert _flush_until_done(core)
+        assert core.sync_worker.totals['failed'] > 0
+
+        assert len(core.journal) == 0
+        events = service.events_in(calendar_id)
+        assert events.keys() == expected.keys()
+        for event_id, end in expected.items():
+            assert _end(events[event_id]) == pytest.approx(end, abs=1e-3)
+    finally:
+        core.close()
+
+
+def test_retried_insert_is_not_duplicated(core):
+    from session import event_body
+    service, calendar_id = fakes.connect_core(core)
+    segment = {'summary': 'write docs', 'start': time.time() - 600, 'end': time.time()}
+    core.journal.append('retried0event', segment)
+    # An earlier attempt reached Google but its response was lost.
+    service.put_event(calendar_id, event_body('retried0event', segment))
+
+    assert core.sync_worker.flush()
+    assert len(core.journal) == 0
+    assert list(service.events_in(calendar_id)) == ['retried0event']
+
+
+def test_quick_resume_extends_the_synced_event(core):
+    service, calendar_id = fakes.connect_core(core)
+    core.start_task('review')
+    core.pause_task()
+    assert core.sync_worker.flush()
+    core.start_task()
+    status = core.pause_task()
+    assert status['task'] == 'review'
+    assert core.sync_worker.flush()
+
+    events = service.events_in(calendar_id)
+    assert list(events) == [core.session.event_id]
+    assert _end(events[core.session.event_id]) == pytest.approx(core.session.event_end, abs=1e-3)
+
+
+def test_coalesce_gap_is_read_when_the_core_is_built(monkeypatch):
+    from core import ClockInCore
+    # As when .env.local is loaded after core was imported.
+    monkeypatch.setenv('CLOCKIN_COALESCE_GAP_SECONDS', '0')
+    core = ClockInCore()
+    try:
+        fakes.connect_core(core)
+        core.start_task('review')
+        core.pause_task()
+        first_event = core.session.event_id
+        core.start_task()
+        core.pause_task()
+        assert core.session.event_id != first_event
+    finally:
+        core.close()
+
+
+def test_extension_of_a_remotely_deleted_event_is_dropped(core):
+    service, calendar_id = fakes.connect_core(core)
+    core.start_task('plan')
+    core.pause_task()
+    assert core.sync_worker.flush()
+    service.cancel_event(calendar_id, core.session.event_id)
+    core.start_task()
+    core.pause_task()
+
+    assert core.sync_worker.flush()
+    assert len(core.journal) == 0
+    assert service.events_in(calendar_id) == {}
+
+
+def test_missing_calendar_is_resolved_again(core):
+    service, calendar_id = fakes.connect_core(core)
+    core.calendar_id = 'deleted@group.calendar.google.com'
+    core.start_task('deploy')
+    core.stop_task()
+
+    assert not core.sync_worker.flush()
+    assert _wait_for(lambda: core.calendar_id == calendar_id)
+    assert core.sync_worker.flush()
+    assert len(service.events_in(calendar_id)) == 1
+
+
+def test_abandoned_sign_in_neither_blocks_google_work_nor_sticks(core, monkeypatch):
+    released = threading.Event()
+    timeouts = []
+
+    class AbandonedFlow:
+        @classmethod
+        def from_client_secrets_file(cls, path, scopes):
+            return cls()
+
+        def run_local_server(self, port, timeout_seconds=None):
+            timeouts.append(timeout_seconds)
+            released.wait(5)
+            raise TimeoutError("the user closed the tab")
+
+    flow_module = types.ModuleType('google_auth_oauthlib.flow')
+    flow_module.InstalledAppFlow = AbandonedFlow
+    monkeypatch.setitem(sys.modules, 'google_auth_oauthlib', types.ModuleType('google_auth_oauthlib'))
+    monkeypatch.setitem(sys.modules, 'google_auth_oauthlib.flow', flow_module)
+    changes = []
+    core.add_listener(changes.append)
+
+    core.sign_in()
+    assert _wait_for(lambda: timeouts)
+    assert timeouts[0]
+    assert core.connecting
+    assert core.executor.submit(lambda: 'done').result(timeout=1) == 'done'
+    released.set()
+    assert _wait_for(lambda: not core.connecting)
+    assert changes[-1] == 'connection' and not core.credentials
+
+
+# Calendar mirror
+
+def test_mirror_follows_remote_edits_deletions_and_expired_tokens(core):
+    service, calendar_id = fakes.connect_core(core)
+    start = time.time() - 7200
+    for n in range(600):
+        service.put_event(calendar_id, {
+            'id': f'remote{n}', 'summary': f'task {n % 7}',
+            'start': {'dateTime': fakes.rfc3339(start)}, 'end': {'dateTime': fakes.rfc3339(start + 60)},
+        })
+    assert core.mirror.sync(service, calendar_id) == 600
+    assert len(core.history.event_ids()) == 600
+
+    service.cancel_event(calendar_id, 'remote0')
+    service.put_event(calendar_id, {
+        'id': 'remote1', 'summary': 'renamed',
+        'start': {'dateTime': fakes.rfc3339(start)}, 'end': {'dateTime': fakes.rfc3339(start + 120)},
+    })
+    assert core.mirror.sync(service, calendar_id) == 2
+    assert 'remote0' not in core.history.event_ids()
+
+    service.expire_sync_tokens()
+    service.put_event(calendar_id, {
+        'id': 'remote600', 'summary': 'late',
+        'start': {'dateTime': fakes.rfc3339(start)}, 'end': {'dateTime': fakes.rfc3339(start + 60)},
+    })
+    assert core.mirror.sync(service, calendar_id) == 1
+    assert len(core.history.event_ids()) == 600
+
+
+def test_full_pull_only_sweeps_its_own_calendar(core):
+    service, old_calendar = fakes.connect_core(core)
+    start = time.time() - 7200
+    for n in range(3):
+        service.put_event(old_calendar, {
+            'id': f'old{n}', 'summary': 'before',
+            'start': {'dateTime': fakes.rfc3339(start)}, 'end': {'dateTime': fakes.rfc3339(start + 60)},
+        })
+    assert core.mirror.sync(service, old_calendar) == 3
+    core.history.record('unsynced', 'local', start, start + 60)
+
+    # The calendar was recreated: its first pull is a full one.
+    new_calendar = service.add_calendar()
+    service.put_event(new_calendar, {
+        'id': 'new0', 'summary': 'after',
+        'start': {'dateTime': fakes.rfc3339(start)}, 'end': {'dateTime': fakes.rfc3339(start + 60)},
+    })
+    assert core.mirror.sync(service, new_calendar) == 1
+    assert core.history.event_ids() == {'old0', 'old1', 'old2', 'unsynced', 'new0'}
+
+    service.cancel_event(old_calendar, 'old0')
+    service.expire_sync_tokens()
+    core.mirror.sync(service, old_calendar)
+    assert core.history.event_ids() == {'old1', 'old2', 'unsynced', 'new0'}
+
+
+def test_reports_leave_out_breaks_inside_coalesced_events(core):
+    from sinks import HistorySink, SessionEvent
+    noon = datetime.datetime.combine(datetime.date.today(), datetime.time(12)).timestamp()
+    sink = HistorySink(core.history, core.task_index)
+    # Ten 20-minute segments with 4-minute breaks, all coalesced into one event.
+    for n in range(10):
+        segment_start = noon + n * 24 * 60
+        sink.handle(SessionEvent('pause', 'focus', segment_start + 1200, event_id='coalesced', event_start=noon,
+                                 event_end=segment_start + 1200, new_event=n == 0, segment_start=segment_start))
+    end = noon + 9 * 24 * 60 + 1200
+    assert core.history.today() == [('focus', pytest.approx(200 * 60))]
+
+    # Mirrored back unchanged, then stretched by ten minutes in Google Calendar.
+    assert core.history.apply_changes([('coalesced', 'focus', noon, end)], []) == 0
+    assert core.history.apply_changes([('coalesced', 'focus', noon, end + 600)], []) == 1
+    assert core.history.today() == [('focus', pytest.approx(210 * 60))]
+    core.history.delete('coalesced')
+    assert core.history.today() == []
+
+
+def test_own_events_mirrored_at_whole_seconds_are_unchanged(core):
+    start = time.time() - 3600.75
+    core.history.record('local', 'focus', start, start + 1800.5)
+    # Google Calendar drops the fractions.
+    assert core.history.apply_changes([('local', 'focus', int(start), int(start + 1800.5))], []) == 0
+    assert core.history.apply_changes([('local', 'focus', int(start), int(start) + 1860)], []) == 1
+
+
+def test_pull_leaves_events_with_unsent_ops_alone(core):
+    from sinks import HistorySink, SessionEvent
+    service, calendar_id = fakes.connect_core(core)
+    noon = datetime.datetime.combine(datetime.date.today(), datetime.time(12)).timestamp()
+    sink = HistorySink(core.history, core.task_index)
+    service.put_event(calendar_id, {
+        'id': 'extended', 'summary': 'focus',
+        'start': {'dateTime': fakes.rfc3339(noon)}, 'end': {'dateTime': fakes.rfc3339(noon + 1200)},
+    })
+    sink.handle(SessionEvent('pause', 'focus', noon + 1200, event_id='extended', event_start=noon,
+                             event_end=noon + 1200, new_event=True, segment_start=noon))
+    # Resumed after a 4-minute break; the patch extending the event isn't sent yet.
+    core.journal.append('extended', {'summary': 'focus', 'start': noon, 'end': noon + 2640})
+    sink.handle(SessionEvent('pause', 'focus', noon + 2640, event_id='extended', event_start=noon,
+                             event_end=noon + 2640, segment_start=noon + 1440))
+
+    assert core.mirror.sync(service, calendar_id) == 0
+    assert core.history.today() == [('focus', pytest.approx(2400))]
+    assert core.sync_worker.flush()
+    core.mirror.sync(service, calendar_id)
+    assert core.history.today() == [('focus', pytest.approx(2400))]
+
+
+# Token refresh and Discord
+
+def test_token_refresher_renews_expiring_credentials():
+    pytest.importorskip('google.auth')
+    from token_refresher import REFRESH_MARGIN_SECONDS, TokenRefresher
+    credentials = fakes.FakeCredentials()
+    credentials.expiry -= datetime.timedelta(seconds=3600 - REFRESH_MARGIN_SECONDS / 2)
+    refreshed = []
+    refresher = TokenRefresher(credentials, fakes.FakeHttp(credentials), refreshed.append, lambda: None)
+    refresher.start()
+    try:
+        assert _wait_for(lambda: refreshed)
+        assert credentials.refreshes == 2
+    finally:
+        refresher.stop()
+
+
+def test_refresh_finishing_after_sign_out_is_dropped(core):
+    pytest.importorskip('google.auth')
+    from core import CREDENTIALS_FILE
+    from token_refresher import TokenRefresher
+    fakes.connect_core(core)
+    credentials = core.credentials
+    in_flight, released = threading.Event(), threading.Event()
+
+    class SlowHttp(fakes.FakeHttp):
+        def refresh(self, force=False, stale_token=None):
+            in_flight.set()
+            released.wait(5)
+            super().refresh(force, stale_token)
+
+    refreshed = []
+    refresher = TokenRefresher(credentials, SlowHttp(credentials), refreshed.append, lambda: None)
+    credentials.expiry = None
+    credentials.token = None
+    refresher.start()
+    assert in_flight.wait(5)
+    refresher.stop()
+    released.set()
+    refresher.join(5)
+    assert not refreshed
+
+    core.sign_out()
+    core.handle_credentials_refreshed(credentials, 'old@example.com')
+    assert not os.path.exists(CREDENTIALS_FILE)
+
+
+def test_presence_sends_only_changes():
+    from discord_presence import PresenceWorker
+    presence = PresenceWorker('bench')
+    try:
+        presence.set(details='design', start=1)
+        assert _wait_for(lambda: ('update', {'details': 'design', 'start': 1}) in PRESENCE_LOG)
+        presence.set(details='design', start=1)
+        presence.clear()
+        assert _wait_for(lambda: PRESENCE_LOG[-1] == ('clear', None))
+    finally:
+        presence.stop()
+    calls = [call for call, _ in PRESENCE_LOG]
+    # If the worker connected before the first set(), it cleared what Discord showed then.
+    if calls[1] == 'clear':
+        del calls[1]
+    assert calls == ['connect', 'update', 'clear']
+
+
+def test_presence_reconnects_after_a_failed_connect(monkeypatch):
+    import discord_presence
+    monkeypatch.setattr(discord_presence, 'RECONNECT_MIN_SECONDS', 0.01)
+    fakes.FakeAioPresence.plan = fakes.FaultPlan(fail_next=1)
+    presence = discord_presence.PresenceWorker('bench')
+    try:
+        presence.set(details='debug', start=1)
+        assert _wait_for(lambda: any(call == 'update' for call, _ in PRESENCE_LOG))
+    finally:
+        presence.stop()
+        fakes.FakeAioPresence.plan = fakes.FaultPlan()
+
+
+def test_turning_discord_on_mid_task_only_updates_presence(core):
+    fakes.connect_core(core)
+    kinds = []
+    core.bus.add(type('Recorder', (), {'handle': lambda self, event: kinds.append(event.kind)})())
+    core.start_task('pair')
+    core.set_discord_client_id('bench')
+    try:
+        assert _wait_for(lambda: any(call == 'update' for call, _ in PRESENCE_LOG))
+        assert ('update', {'details': 'pair', 'start': int(core.session.running_since),
+                           'large_image': 'icon', 'large_text': 'Locked in'}) in PRESENCE_LOG
+        assert _wait_for(lambda: kinds) and kinds == ['start']
+    finally:
+        core.set_discord_client_id(None)
+    # The worker clears the presence on its way out; let it finish before the next test.
+    assert _wait_for(lambda: PRESENCE_LOG[-1] == ('clear', None))
+
+
+# Front ends
+
+def test_control_socket_round_trip(core, scratch, monkeypatch):
+    from control import ControlClient, ControlServer
+    fakes.connect_core(core)
+    # Both ends pick the path up when they start, as they would from .env.local.
+    monkeypatch.setenv('CLOCKIN_SOCKET', os.path.join(scratch, 'control.sock'))
+    server = ControlServer(core)
+    server.start()
+    assert server.path == os.path.join(scratch, 'control.sock')
+    client = ControlClient()
+    try:
+        assert client.request('pause') == {'ok': False, 'error': "Start an event first"}
+        started = client.request('start', summary='  email  ')
+        assert started['ok'] and started['status']['task'] == 'email' and started['status']['running']
+        assert client.request('pause')['status']['running'] is False
+        assert client.request('stop')['status']['task'] is None
+        assert client.request('status')['status']['pending_sync'] == 1
+        assert 'action.start' in client.request('metrics')['metrics']['latency']
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_menu_follows_the_session():
+    pytest.importorskip('dotenv')
+    menu_app = harness.launch_app()
+    try:
+        common = ['Today', 'This Week', 'Quit']
+        assert headless.visible_items(menu_app) == ['bench@example.com', 'Preferences', '⏵'] + common
+        menu_app.start_event(None, 'research')
+        headless.run_pending()
+        assert headless.visible_items(menu_app) == ['bench@example.com', 'Preferences', '⏸', '⏹'] + common
+        assert menu_app.title.startswith('research • for')
+        menu_app.pause_event(None)
+        headless.run_pending()
+        assert headless.visible_items(menu_app) == ['bench@example.com', 'Preferences', '⏵', '⏹'] + common
+        assert menu_app.title == 'research • ⏸'
+        menu_app.stop_event(None)
+        assert _run_until(lambda: len(menu_app.core.history.event_ids()) == 1)
+        assert headless.visible_items(menu_app) == ['bench@example.com', 'Preferences', '⏵'] + common
+        assert not headless.alerts
+    finally:
+        harness.close_app(menu_app)
+
+
+def test_reports_roll_over_at_midnight_without_any_action():
+    pytest.importorskip('dotenv')
+    menu_app = harness.launch_app()
+    try:
+        rollovers = [(due, args) for due, _, function, args in headless._scheduled
+                     if function == menu_app.on_day_rollover]
+        assert len(rollovers) == 1
+        due, args = rollovers[0]
+        midnight = datetime.datetime.combine(datetime.date.today() + datetime.timedelta(days=1), datetime.time())
+        assert due - time.monotonic() == pytest.approx((midnight - datetime.datetime.now()).total_seconds(), abs=5)
+
+        # Midnight passes while idle: yesterday's reports give way to today's.
+        now = time.time()
+        menu_app.core.history.record('overnight', 'night shift', now - 600, now)
+        menu_app.reports_day -= datetime.timedelta(days=1)
+        menu_app.on_day_rollover(*args)
+        assert list(menu_app.today_menu) == ['night shift • 10m']
+        assert menu_app.reports_day == datetime.date.today()
+        assert menu_app.day_rollover_generation == args[0] + 1
+    finally:
+        harness.close_app(menu_app)
+
+
+def test_quit_drains_the_sinks(scratch, monkeypatch):
+    pytest.importorskip('dotenv')
+    from sinks import FileExportSink
+    # Set after core was imported, as .env.local is.
+    monkeypatch.setenv('CLOCKIN_EXPORT_FILE', str(scratch / 'sessions.csv'))
+    # Held up until after Quit is clicked, so the events are still queued then.
+    released = threading.Event()
+    handle = FileExportSink.handle
+    monkeypatch.setattr(FileExportSink, 'handle', lambda self, event: released.wait(5) and handle(self, event))
+    menu_app = harness.launch_app()
+    try:
+        menu_app.start_event(None, 'wrap up')
+        menu_app.pause_event(None)
+        # Past the control server's shutdown, which waits up to half a second.
+        threading.Timer(1, released.set).start()
+        menu_app.menu['Quit'].callback(None)
+        with open(scratch / 'sessions.csv') as exported:
+            assert 'wrap up' in exported.read()
+        # The final snapshot is written after the sinks drained.
+        with open(os.environ['CLOCKIN_METRICS_FILE']) as metrics_file:
+            sinks = json.load(metrics_file)['sinks']
+        assert sinks['FileExportSink']['handled'] == 2
+        assert all(stats['queued'] == 0 for stats in sinks.values())
+        assert not os.path.exists(os.environ['CLOCKIN_SOCKET'])
+    finally:
+        harness.close_app(menu_app)
+
+
+def test_log_and_metrics_settings_are_read_at_setup(scratch, monkeypatch):
+    import logging
+    from logs import configure_logging
+    from metrics import SnapshotWriter
+    # Set after logs and metrics were imported, as .env.local is.
+    monkeypatch.setenv('CLOCKIN_LOG_FILE', str(scratch / 'debug.log'))
+    monkeypatch.setenv('CLOCKIN_LOG_LEVEL', 'debug')
+    monkeypatch.setenv('CLOCKIN_METRICS_FILE', str(scratch / 'snapshot.json'))
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    try:
+        configure_logging()
+        assert root.level == logging.DEBUG
+        logging.getLogger('bench').debug("details")
+    finally:
+        for handler in set(root.handlers) - set(handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.setLevel(level)
+    with open(scratch / 'debug.log') as log_file:
+        assert 'details' in log_file.read()
+    SnapshotWriter().stop()
+    assert os.path.exists(scratch / 'snapshot.json')
+
+
+def test_closing_the_app_puts_google_back():
+    pytest.importorskip('dotenv')
+    import core
+    import google_api
+    real_load_credentials = core.ClockInCore.load_credentials
+    harness.close_app(harness.launch_app())
+    assert core.build_service is google_api.build_service
+    assert core.shared_http is google_api.shared_http
+    assert core.ClockInCore.load_credentials is real_load_credentials
+
+
+def test_menu_without_credentials_offers_sign_in(monkeypatch):
+    pytest.importorskip('dotenv')
+    import core
+    monkeypatch.setattr(core.ClockInCore, 'load_credentials', lambda self: None)
+    import app
+    menu_app = app.MenuApp()
+    try:
+        assert _run_until(lambda: 'ready' in menu_app.startup_timings)
+        assert headless.visible_items(menu_app) == ['Sign in with Google', 'Preferences', 'Today', 'This Week', 'Quit']
+        menu_app.start_event(None)
+        assert headless.alerts == [("Sign in first", '')]
+    finally:
+        harness.close_app(menu_app)
+
+
+# Task autocomplete
+
+def test_walked_suggestions_match_a_full_ranking(monkeypatch):
+    from task_index import TaskIndex
+    rng = random.Random(3)
+    names = harness.task_names(4000, seed=3)
+    now = time.time()
+    uses = [(rng.choice(names), now - rng.uniform(0, 90 * 86400)) for _ in range(12000)]
+    walked, ranked = TaskIndex(), TaskIndex()
+    monkeypatch.setattr(ranked, '_walk', lambda matching, tests, limit: None)
+    for index in (walked, ranked):
+        index.load(uses[:10000])
+        # Later uses reorder tasks that are already ranked.
+        for summary, when in uses[10000:]:
+            index.record(summary, when + 90 * 86400)
+
+    queries = {''} | {name[:length] for name in rng.sample(names, 200) for length in (1, 2, 3, 5)}
+    queries |= {' '.join(word[:rng.randint(1, 3)] for word in rng.sample(names, 1)[0].split()) for _ in range(300)}
+    # Inside words and with typos, for the fuzzy tiers.
+    queries |= {word[1:] for word in harness.TASK_WORDS}
+    queries |= {word[0] + word[2] + word[1] + word[3:] for word in harness.TASK_WORDS}
+    for query in sorted(queries):
+        assert walked.suggest(query) == ranked.suggest(query), query
+
+
+def test_suggestions_fall_back_to_inner_words_and_typos():
+    from task_index import TaskIndex
+    now = time.time()
+    index = TaskIndex()
+    index.load([('Review PR #12', now - 60), ('Design doc', now - 120), ('Interview prep', now - 7 * 86400),
+                ('Deploy api', now)])
+    assert index.suggest('view') == ['Review PR #12', 'Interview prep']
+    assert index.suggest('desgin') == index.suggest('dsign') == index.suggest('xdesign') == ['Design doc']
+    # Exact word prefixes come first, then words containing the text, then typos.
+    index.record('Viewer bug', now - 30 * 86400)
+    index.record('Vieq setup', now)
+    assert index.suggest('view') == ['Viewer bug', 'Review PR #12', 'Interview prep', 'Vieq setup']
+    # Short words are only matched by prefix.
+    assert index.suggest('dep') == ['Deploy api'] and index.suggest('esi') == []
+
+
+# The benchmark runner itself
+
+def test_runner_flags_regressions_in_either_direction():
+    from bench.run import compare
+    baselines = {'a_ms': {'value': 10.0, 'tolerance': 0.5}, 'b_per_s': {'value': 100.0, 'tolerance': 0.5}}
+    rows = {row[0]: row for row in compare({'a_ms': 16.0, 'b_per_s': 60.0, 'c_us': 1.0}, baselines)}
+    assert rows['a_ms'][4] and rows['b_per_s'][4]
+    assert not rows['c_us'][4]
+    rows = {row[0]: row for row in compare({'a_ms': 14.0, 'b_per_s': 200.0}, baselines)}
+    assert not rows['a_ms'][4] and not rows['b_per_s'][4]
+
+
+# Export
+
+def _put_sessions(service, calendar_id, count, first_start):
+    for n in range(count):
+        start = first_start + n * 3600
+        service.put_event(calendar_id, {
+            'id': f'session{n:05d}', 'summary': 'Acme review' if n % 3 == 0 else f'other {n}',
+            'start': {'dateTime': fakes.rfc3339(start)}, 'end': {'dateTime': fakes.rfc3339(start + 1800)},
+        })
+
+
+def test_calendar_export_pages_and_filters_at_the_source(monkeypatch):
+    import export
+    monkeypatch.setattr(export, 'PAGE_SIZE', 10)
+    service = fakes.FakeCalendarService()
+    calendar_id = service.add_calendar()
+    first_start = 1_700_000_000
+    _put_sessions(service, calendar_id, 100, first_start)
+    listed = []
+    list_events = service._list_events
+    monkeypatch.setattr(service, '_list_events', lambda **params: listed.append(params) or list_events(**params))
+
+    # "view" is only part of a word, so Calendar's own search would miss "Acme review".
+    events = export.calendar_events(service, calendar_id, first=first_start + 30 * 3600 + 900,
+                                    last=first_start + 90 * 3600, task='VIEW')
+    assert not listed  # nothing is fetched until the export pulls
+    ids = [event_id for event_id, _, _, _ in events]
+    assert ids == [f'session{n:05d}' for n in range(33, 90, 3)]
+    assert all('q' not in params and 'timeMin' in params and 'timeMax' in params for params in listed)
+    # Google returned only the 60 sessions overlapping the range, in six pages.
+    assert len(listed) == 6
+
+
+def test_both_export_sources_match_tasks_alike(core):
+    import export
+    service, calendar_id = fakes.connect_core(core)
+    start = time.time() - 7200
+    for n, summary in enumerate(['Überprüfung', 'Straße bauen', 'ÉTÉ plan', 'other']):
+        core.history.record(f'fold{n}', summary, start + n, start + n + 60)
+        service.put_event(calendar_id, {
+            'id': f'fold{n}', 'summary': summary,
+            'start': {'dateTime': fakes.rfc3339(start + n)}, 'end': {'dateTime': fakes.rfc3339(start + n + 60)},
+        })
+    for task in ('ÜBER', 'strasse', 'été'):
+        from_history = [event_id for event_id, _, _, _ in core.history.segments(task=task)]
+        from_calendar = [event_id for event_id, _, _, _ in export.calendar_events(service, calendar_id, task=task)]
+        assert from_history == from_calendar and len(from_history) == 1, task
+
+
+def test_export_formats():
+    import csv
+    import io
+    import export
+    events = [('a1', 'Acme, "review"', 1_700_000_000, 1_700_001_800), ('a2', 'ünïcode ' * 12, 1_700_003_600, 1_700_005_400)]
+    ics = io.StringIO()
+    assert export.write_events(iter(events), 'ics', ics) == 2
+    lines = ics.getvalue().split('\r\n')
+    assert lines[0] == 'BEGIN:VCALENDAR' and lines[-2] == 'END:VCALENDAR' and lines.count('BEGIN:VEVENT') == 2
+    assert all(len(line.encode('utf-8')) <= 75 for line in lines)
+
+    out = io.StringIO()
+    export.write_events(iter(events), 'csv', out)
+    rows = list(csv.reader(io.StringIO(out.getvalue())))
+    assert rows[0] == ['event_id', 'summary', 'start', 'end', 'seconds']
+    assert rows[1][1] == 'Acme, "review"' and rows[1][4] == '1800'
+
+    out = io.StringIO()
+    export.write_events(iter(events), 'jsonl', out)
+    assert [json.loads(line)['event_id'] for line in out.getvalue().splitlines()] == ['a1', 'a2']
+
+
+def test_calendar_export_memory_stays_flat():
+    import tracemalloc
+    import export
+
+    def peak_for(count):
+        service = fakes.FakeCalendarService()
+        calendar_id = service.add_calendar()
+        _put_sessions(service, calendar_id, count, 1_700_000_000)
+        out = type('Discard', (), {'write': lambda self, text: None})()
+        tracemalloc.start()
+        try:
+            assert export.write_events(export.calendar_events(service, calendar_id), 'csv', out) == count
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    assert peak_for(4 * export.PAGE_SIZE) < 2 * peak_for(export.PAGE_SIZE)
+
+
+def test_history_export_from_the_command_line(scratch, monkeypatch, capsys):
+    pytest.importorskip('dotenv')
+    import clockin_cli
+    from core import HISTORY_FILE
+    from history import HistoryStore
+    history = HistoryStore(HISTORY_FILE)
+    june = datetime.datetime(2026, 6, 1).timestamp()
+    history.apply_changes([(f'h{n:04d}', 'Acme' if n % 2 else 'Other', june + n * 3600, june + n * 3600 + 600)
+                           for n in range(24 * 45)], [])
+    history.close()
+
+    monkeypatch.setattr('sys.argv', ['clockin_cli.py', 'export', '--source', 'history', '-o', 'june.jsonl',
+                                     '--from', '2026-06-01', '--to', '2026-06-30', '--task', 'acme'])
+    clockin_cli.main()
+    assert "Exported 360 session(s) to june.jsonl" in capsys.readouterr().err
+    with open(scratch / 'june.jsonl') as exported:
+        sessions = [json.loads(line) for line in exported]
+    assert len(sessions) == 360 and {session['summary'] for session in sessions} == {'Acme'}
+    assert sessions[0]['start'].startswith('2026-06-01T01:00') and sessions[-1]['start'].startswith('2026-06-30T23:00')
+    assert not os.path.exists(scratch / 'june.jsonl.tmp')
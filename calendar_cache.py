@@ -0,0 +1,44 @@
+"""On-disk cache of the resolved cLockIn calendar ID, keyed by user email."""
+import json
+import os
+import threading
+import time
+
+# Within this window a cached ID is trusted without asking Google at all.
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+class CalendarIdCache:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r') as cache_file:
+                self._entries = json.load(cache_file)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, email):
+        """Returns (calendar_id, fresh), or (None, False) on a miss."""
+        entry = self._entries.get(email) if email else None
+        if not entry:
+            return None, False
+        return entry['id'], time.time() - entry['verified_at'] < CACHE_TTL_SECONDS
+
+    def put(self, email, calendar_id):
+        if not email:
+            return
+        with self._lock:
+            self._entries[email] = {'id': calendar_id, 'verified_at': time.time()}
+            self._save()
+
+    def invalidate(self, email):
+        with self._lock:
+            if self._entries.pop(email, None):
+                self._save()
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as cache_file:
+            json.dump(self._entries, cache_file)
+        os.replace(tmp_path, self.path)
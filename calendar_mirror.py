@@ -0,0 +1,91 @@
+"""Pulls edits made directly in Google Calendar back into the local history.
+
+The first pull pages through the whole cLockIn calendar and stores the
+nextSyncToken Google returns. Every later pull sends that token and gets
+back only the events that changed since. When the token has expired
+(410 Gone), it is dropped and a full pull runs again. A full pull also
+removes local events that were mirrored from this calendar and no longer
+exist there. History from other calendars, e.g. one that was deleted and
+recreated or another account's, is left alone.
+"""
+import datetime
+import logging
+
+from calendar_sync import http_status
+from metrics import timed
+
+log = logging.getLogger(__name__)
+
+PAGE_SIZE = 250
+EVENT_FIELDS = 'nextPageToken,nextSyncToken,items(id,status,summary,start,end)'
+
+
+def event_time(when):
+    # All-day events only carry a 'date'; cLockIn never creates those.
+    date_time = when.get('dateTime') if when else None
+    return datetime.datetime.fromisoformat(date_time).timestamp() if date_time else None
+
+
+class CalendarMirror:
+    def __init__(self, history, journal, on_changed=None):
+        self.history = history
+        # Events still in the journal haven't reached Google yet, so what
+        # Google says about them is stale until their ops are sent.
+        self.journal = journal
+        # Called on the syncing thread whenever the history changed.
+        self.on_changed = on_changed
+
+    def sync(self, service, calendar_id):
+        key = f'sync_token:{calendar_id}'
+        sync_token = self.history.get_meta(key)
+        try:
+            changed, next_sync_token = self._pull(service, calendar_id, sync_token)
+        except Exception as e:
+            if sync_token is None or http_status(e) != 410:
+                raise
+            log.debug("Calendar sync token expired, running a full sync...")
+            self.history.set_meta(key, None)
+            changed, next_sync_token = self._pull(service, calendar_id, None)
+        self.history.set_meta(key, next_sync_token)
+        if changed:
+            log.info(f"Mirrored {changed} change(s) from Google Calendar")
+            if self.on_changed:
+                self.on_changed()
+        return changed
+
+    def _pull(self, service, calendar_id, sync_token):
+        full_sync = sync_token is None
+        pending = {event_id for event_id, _, _ in self.journal.pending()}
+        seen = set()
+        changed = 0
+        page_token = None
+        while True:
+            params = {'calendarId': calendar_id, 'maxResults': PAGE_SIZE, 'fields': EVENT_FIELDS}
+            if page_token:
+                params['pageToken'] = page_token
+            if sync_token:
+                params['syncToken'] = sync_token
+            with timed('calendar.events_list'):
+                page = service.events().list(**params).execute()
+
+            upserts = []
+            deletions = []
+            for item in page.get('items', []):
+                seen.add(item['id'])
+                if item['id'] in pending:
+                    continue
+                start, end = event_time(item.get('start')), event_time(item.get('end'))
+                if item.get('status') == 'cancelled' or start is None or end is None:
+                    deletions.append(item['id'])
+                else:
+                    upserts.append((item['id'], item.get('summary', ''), start, end))
+            changed += self.history.apply_changes(upserts, deletions, calendar_id)
+
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                break
+
+        if full_sync:
+            gone = self.history.event_ids(calendar_id) - seen - pending
+            changed += self.history.apply_changes([], gone)
+        return changed, page.get('nextSyncToken')
@@ -0,0 +1,148 @@
+"""Background worker that drains the session journal into Google Calendar."""
+import logging
+import threading
+import time
+
+from metrics import timed
+from session import event_body, patch_body
+
+log = logging.getLogger(__name__)
+
+RETRY_MIN_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+# The Calendar batch endpoint accepts up to 50 calls per request.
+BATCH_SIZE = 50
+# After a wake-up, wait this long so rapid pause/resume toggles share a batch.
+BATCH_DELAY_SECONDS = 2
+# How often remote edits are pulled back through the calendar mirror.
+MIRROR_INTERVAL_SECONDS = 5 * 60
+
+
+def http_status(error):
+    # googleapiclient's HttpError carries the response as `resp`; anything
+    # without one (socket errors, timeouts) is a transport failure.
+    resp = getattr(error, 'resp', None)
+    return getattr(resp, 'status', None)
+
+
+class CalendarSyncWorker(threading.Thread):
+    def __init__(self, journal, get_target, on_calendar_missing=None, mirror=None):
+        super().__init__(name="calendar-sync", daemon=True)
+        self.journal = journal
+        # Returns (calendar_service, calendar_id), or (None, None) while signed out.
+        self.get_target = get_target
+        # Called when the calendar itself 404s, so its cached ID can be re-resolved.
+        self.on_calendar_missing = on_calendar_missing
+        # Optional CalendarMirror, run on this thread after successful flushes.
+        self.mirror = mirror
+        self._next_mirror = 0.0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.last_flush = {'batches': 0, 'items': 0, 'failed': 0}
+        self.totals = {'flushes': 0, 'batches': 0, 'items': 0, 'failed': 0}
+
+    def wake(self, mirror=False):
+        if mirror:
+            self._next_mirror = 0.0
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def run(self):
+        delay = None
+        while True:
+            timeout = delay
+            if self.mirror and delay is None:
+                # While flushes are failing the retry delay paces the mirror too.
+                timeout = max(0.0, self._next_mirror - time.monotonic())
+            woken = self._wake.wait(timeout)
+            if woken and self._stopped.wait(BATCH_DELAY_SECONDS):
+                return
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                done = self.flush()
+            except Exception as e:
+                log.warning(f"Calendar sync failed: {e}")
+                done = False
+            if done and self.mirror and time.monotonic() >= self._next_mirror:
+                self.pull_remote_changes()
+            if done:
+                delay = None
+            else:
+                delay = min(RETRY_MAX_SECONDS, delay * 2) if delay else RETRY_MIN_SECONDS
+                log.warning(f"{len(self.journal)} segment(s) still pending, retrying in {delay}s")
+
+    def pull_remote_changes(self):
+        # Runs on this thread so no flush can land between listing and sweeping.
+        self._next_mirror = time.monotonic() + MIRROR_INTERVAL_SECONDS
+        service, calendar_id = self.get_target()
+        if not service or not calendar_id:
+            return
+        try:
+            self.mirror.sync(service, calendar_id)
+        except Exception as e:
+            log.warning(f"Calendar mirror failed: {e}")
+
+    def flush(self):
+        """Sends every pending segment; returns True once the journal is empty."""
+        service, calendar_id = self.get_target()
+        if not service or not calendar_id:
+            # Nothing to retry against; signing in wakes the worker again.
+            return True
+        pending = self.journal.pending()
+        stats = {'batches': 0, 'items': 0, 'failed': 0}
+        try:
+            for offset in range(0, len(pending), BATCH_SIZE):
+                self._send_batch(service, calendar_id, pending[offset:offset + BATCH_SIZE], stats)
+        finally:
+            self.last_flush = stats
+            self.totals['flushes'] += 1
+            for key in stats:
+                self.totals[key] += stats[key]
+            if stats['batches']:
+                log.info(f"Flushed {stats['items']} segment(s) in {stats['batches']} batch(es), {stats['failed']} failed",
+                         extra={'flush': stats})
+        return not stats['failed']
+
+    def _send_batch(self, service, calendar_id, chunk, stats):
+        segments = {}  # what each request sent, so mark_synced can spot later extensions
+        synced = []
+        missing = []
+
+        def on_response(event_id, response, exception):
+            status = http_status(exception) if exception else None
+            # 409 means an earlier attempt already created this event ID.
+            if exception is None or status == 409:
+                synced.append((event_id, segments[event_id]))
+            elif status == 404 and 'summary' not in segments[event_id]:
+                # The event being extended was deleted in Google Calendar; nothing left to patch.
+                log.warning(f"Event {event_id} no longer exists, dropping its extension")
+                synced.append((event_id, segments[event_id]))
+            else:
+                log.warning(f"Failed to sync event {event_id}: {exception}")
+                if status == 404:
+                    missing.append(event_id)
+
+        batch = service.new_batch_http_request(callback=on_response)
+        for event_id, op, segment in chunk:
+            segments[event_id] = segment
+            if op == 'insert':
+                request = service.events().insert(calendarId=calendar_id, body=event_body(event_id, segment), fields='id')
+            else:
+                request = service.events().patch(calendarId=calendar_id, eventId=event_id, body=patch_body(segment), fields='id')
+            batch.add(request, request_id=event_id)
+        stats['batches'] += 1
+        stats['items'] += len(chunk)
+        try:
+            with timed('calendar.batch'):
+                batch.execute()
+        finally:
+            # Anything not marked synced stays in the journal for the next flush.
+            self.journal.mark_synced(synced)
+            stats['failed'] += len(chunk) - len(synced)
+        if missing and self.on_calendar_missing:
+            self.on_calendar_missing()
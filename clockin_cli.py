@@ -0,0 +1,152 @@
+"""Command-line client for a running cLockIn, plus a headless server mode.
+
+    python clockin_cli.py start "Write docs"   # start (or switch to) a task
+    python clockin_cli.py start                # resume the paused task
+    python clockin_cli.py pause
+    python clockin_cli.py stop
+    python clockin_cli.py status [--json]
+    python clockin_cli.py metrics              # latency histograms and counters as JSON
+    python clockin_cli.py serve                # run the engine without the menu bar
+    python clockin_cli.py export -o june.csv --from 2026-06-01 --to 2026-06-30 [--task Acme]
+
+The client commands talk to the menu bar app, or to `serve`, over the
+control socket (see control.py). They exit with status 1 if the request
+was refused and 2 if nothing is listening. `export` works on its own; it
+reads the cLockIn calendar (or, with --source history, the local history)
+and streams it to a file or stdout (see export.py).
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+
+from control import ControlClient
+
+log = logging.getLogger(__name__)
+
+
+def format_status(status):
+    if not status['signed_in']:
+        account = "connecting to Google" if status['connecting'] else "not signed in"
+    else:
+        account = f"signed in as {status['email'] or 'unknown'}"
+    if not status['task']:
+        task = "No task"
+    else:
+        minutes = int(status['elapsed']) // 60
+        state = "running" if status['running'] else "paused"
+        task = f"{status['task']} ({state}, {minutes // 60}h {minutes % 60}m total)"
+    pending = f", {status['pending_sync']} segment(s) waiting to sync" if status['pending_sync'] else ""
+    return f"{task}; {account}{pending}"
+
+
+def serve(socket_path):
+    from core import ClockInCore
+    from control import ControlServer
+    from logs import configure_logging
+
+    configure_logging()
+    core = ClockInCore(discord_client_id=os.getenv('DISCORD_APP_CLIENT_ID'))
+    server = ControlServer(core, socket_path)
+    core.start()
+    server.start()
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    stopped.wait()
+    log.info("Shutting down...")
+    server.stop()
+    core.close()
+
+
+def local_midnight(day):
+    return datetime.datetime.combine(day, datetime.time()).timestamp()
+
+
+def run_export(args):
+    from core import HISTORY_FILE, ClockInError
+    from export import calendar_events, export_to_file, format_for, open_calendar, write_events
+    from history import HistoryStore
+
+    first = local_midnight(args.first) if args.first else None
+    # --to is inclusive, so stop at the following midnight.
+    last = local_midnight(args.last + datetime.timedelta(days=1)) if args.last else None
+    export_format = args.format or format_for(args.output)
+    try:
+        if args.source == 'history':
+            events = HistoryStore(HISTORY_FILE).segments(first, last, args.task)
+        else:
+            service, calendar_id = open_calendar()
+            events = calendar_events(service, calendar_id, first, last, args.task)
+        if args.output:
+            count = export_to_file(events, export_format, args.output)
+        else:
+            count = write_events(events, export_format, sys.stdout)
+    except ClockInError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f"Exported {count} session(s)" + (f" to {args.output}" if args.output else ""), file=sys.stderr)
+
+
+def main():
+    from dotenv import load_dotenv
+
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--socket', help="control socket path (default: $CLOCKIN_SOCKET or ~/.clockin.sock)")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    start_parser = commands.add_parser('start', help="start a task, or resume the paused one")
+    start_parser.add_argument('summary', nargs='?', help="task to work on")
+    commands.add_parser('pause', help="pause the running task")
+    commands.add_parser('stop', help="finish the current task")
+    status_parser = commands.add_parser('status', help="show what is being tracked")
+    status_parser.add_argument('--json', action='store_true', help="print the raw status")
+    commands.add_parser('metrics', help="print latency histograms and sync/sink counters")
+    commands.add_parser('serve', help="run cLockIn headless, without the menu bar")
+    export_parser = commands.add_parser('export', help="export finished sessions as ICS, CSV or JSON Lines")
+    export_parser.add_argument('-o', '--output', help="file to write (default: stdout)")
+    export_parser.add_argument('--format', choices=('ics', 'csv', 'jsonl'),
+                               help="output format (default: from the file extension, else csv)")
+    export_parser.add_argument('--from', dest='first', type=datetime.date.fromisoformat, metavar='YYYY-MM-DD',
+                               help="first day to export")
+    export_parser.add_argument('--to', dest='last', type=datetime.date.fromisoformat, metavar='YYYY-MM-DD',
+                               help="last day to export, inclusive")
+    export_parser.add_argument('--task', help="only tasks whose name contains this")
+    export_parser.add_argument('--source', choices=('calendar', 'history'), default='calendar',
+                               help="read Google Calendar (default) or the local history")
+    args = arg_parser.parse_args()
+    # Before the core or the client read their settings, CLOCKIN_SOCKET included.
+    load_dotenv('.env.local')
+
+    if args.command == 'serve':
+        serve(args.socket)
+        return
+    if args.command == 'export':
+        run_export(args)
+        return
+
+    params = {'summary': args.summary} if args.command == 'start' and args.summary else {}
+    try:
+        client = ControlClient(args.socket)
+        response = client.request(args.command, **params)
+        client.close()
+    except OSError as e:
+        print(f"cLockIn is not running ({e})", file=sys.stderr)
+        sys.exit(2)
+    if not response['ok']:
+        print(response['error'], file=sys.stderr)
+        sys.exit(1)
+    if args.command == 'metrics':
+        print(json.dumps(response['metrics'], indent=2))
+    elif args.command == 'status' and args.json:
+        print(json.dumps(response['status']))
+    else:
+        print(format_status(response['status']))
+
+
+if __name__ == "__main__":
+    main()
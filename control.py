@@ -0,0 +1,143 @@
+"""Local control API for cLockIn over a Unix socket.
+
+Each request and response is one line of JSON:
+
+    {"command": "start", "summary": "Write docs"}
+    {"ok": true, "status": {"task": "Write docs", "running": true, ...}}
+    {"ok": false, "error": "Sign in first"}
+
+The commands are start (with an optional summary; without one it resumes
+the paused task), pause, stop, status and metrics (latency histograms plus
+sync and sink counters). A connection can send any number
+of requests. The socket is only accessible to the current user.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+
+from metrics import observe
+
+log = logging.getLogger(__name__)
+
+# Default for CLOCKIN_SOCKET.
+SOCKET_PATH = '~/.clockin.sock'
+COMMANDS = ('start', 'pause', 'stop', 'status', 'metrics')
+
+
+def socket_path():
+    # Read when connecting rather than at import, so .env.local can set it.
+    return os.path.expanduser(os.getenv('CLOCKIN_SOCKET', SOCKET_PATH))
+
+
+def handle_command(core, request):
+    from core import ClockInError
+
+    command = request.get('command')
+    try:
+        if command == 'metrics':
+            return {'ok': True, 'metrics': core.metrics()}
+        if command == 'start':
+            status = core.start_task(request.get('summary'))
+        elif command == 'pause':
+            status = core.pause_task()
+        elif command == 'stop':
+            status = core.stop_task()
+        elif command == 'status':
+            status = core.status()
+        else:
+            return {'ok': False, 'error': f"Unknown command: {command}"}
+    except ClockInError as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': True, 'status': status}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            start = time.perf_counter()
+            command = None
+            try:
+                request = json.loads(line)
+                if isinstance(request, dict):
+                    command = request.get('command')
+                    response = handle_command(self.server.core, request)
+                else:
+                    response = {'ok': False, 'error': "Requests must be JSON objects"}
+            except ValueError:
+                response = {'ok': False, 'error': "Invalid JSON"}
+            except Exception:
+                log.exception("Control request failed")
+                response = {'ok': False, 'error': "Internal error"}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+            if command in COMMANDS:
+                observe(f'control.{command}', time.perf_counter() - start)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ControlServer:
+    def __init__(self, core, path=None):
+        self.path = path = path or socket_path()
+        self._clear_stale_socket()
+        old_umask = os.umask(0o077)
+        try:
+            self._server = _Server(path, _Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.core = core
+        self._thread = None
+
+    def _clear_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            # Left behind by a process that didn't shut down cleanly.
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise OSError(f"Another cLockIn is already listening on {self.path}")
+
+    def start(self):
+        """Serves requests on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="control", daemon=True)
+        self._thread.start()
+        log.info(f"Control socket listening on {self.path}")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class ControlClient:
+    """Talks to a running cLockIn over its control socket."""
+
+    def __init__(self, path=None, timeout=5):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(path or socket_path())
+        self._file = self._socket.makefile('rwb')
+
+    def request(self, command, **params):
+        self._file.write(json.dumps(dict(params, command=command)).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("cLockIn closed the control socket")
+        return json.loads(line)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
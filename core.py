@@ -0,0 +1,500 @@
+"""The cLockIn engine, with no UI attached.
+
+ClockInCore owns the tracked session, the journal and calendar sync
+worker, the local history, Discord presence and the Google connection. It
+imports nothing from rumps or Cocoa, so it also runs headless (see
+clockin_cli.py serve) and on Linux.
+
+Every front end is a client. The menu bar app calls it in-process and the
+control socket (control.py) calls it for scripts and editor hooks. Calls
+can come from any thread; a lock serializes them. Listeners are told what
+changed ('session', 'connection', 'signed_in', 'revoked', 'history') on
+the thread that changed it, so a UI has to hop to its own thread itself.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from journal import SessionJournal, new_event_id
+from calendar_sync import CalendarSyncWorker, http_status
+from calendar_cache import CalendarIdCache
+from google_api import build_service, shared_http
+from token_refresher import TokenRefresher
+from discord_presence import PresenceWorker
+from session import Session
+from history import HistoryStore
+from calendar_mirror import CalendarMirror
+from task_index import TaskIndex
+from metrics import SnapshotWriter, snapshot, timed
+from sinks import (EventBus, SessionEvent, CalendarSink, HistorySink, PresenceSink, WebhookSink,
+                   FileExportSink)
+
+log = logging.getLogger(__name__)
+
+# Path to the OAuth 2.0 client secrets file downloaded from the Google Cloud Console
+CLIENT_SECRETS_FILE = 'google_client_secrets.json'
+SCOPES = ['openid', 'https://www.googleapis.com/auth/calendar', 'https://www.googleapis.com/auth/userinfo.email']
+CREDENTIALS_FILE = 'token.json'
+JOURNAL_FILE = 'journal.jsonl'
+CALENDAR_CACHE_FILE = 'calendar_cache.json'
+HISTORY_FILE = 'history.sqlite3'
+# Resuming within this many seconds of a pause extends the previous calendar
+# event with a patch instead of inserting a new one. 0 turns coalescing off.
+# CLOCKIN_COALESCE_GAP_SECONDS overrides it.
+COALESCE_GAP_SECONDS = 5 * 60
+CALENDAR_TITLE = "cLockIn"
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+# How long the browser sign-in waits for the user before giving up.
+SIGN_IN_TIMEOUT_SECONDS = 5 * 60
+
+
+class ClockInError(Exception):
+    """A request the current state doesn't allow; the message is meant for the user."""
+
+
+def email_from_id_token(id_token, client_id):
+    # The ID token comes straight from Google's token endpoint over TLS, so
+    # checking its claims is enough; no signature fetch or round trip needed.
+    from google.auth import jwt
+    try:
+        claims = jwt.decode(id_token, verify=False)
+    except Exception as e:
+        log.warning(f"Could not decode ID token: {e}")
+        return None
+    if claims.get('iss') not in GOOGLE_ISSUERS or claims.get('aud') != client_id:
+        log.warning("ID token was not issued for this client, ignoring it.")
+        return None
+    if not claims.get('email_verified'):
+        return None
+    return claims.get('email')
+
+
+class ClockInCore:
+    def __init__(self, discord_client_id=None):
+        self._lock = threading.RLock()
+        self._listeners = []
+        self.credentials = None
+        self.calendar_service = None
+        self.session = None
+        self.user_email = None
+        self.calendar_id = None
+        self.connecting = True
+        self.token_refresher = None
+        # Settings are read here rather than at import, so .env.local can set them.
+        self.coalesce_gap_seconds = float(os.getenv('CLOCKIN_COALESCE_GAP_SECONDS', COALESCE_GAP_SECONDS))
+
+        # Every Google network call runs here, one at a time.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="google")
+
+        # Finished segments land in the journal first; the worker drains it to Google Calendar.
+        # Edits made in Google Calendar flow back into the local history through the mirror.
+        self.journal = SessionJournal(JOURNAL_FILE)
+        self.calendar_cache = CalendarIdCache(CALENDAR_CACHE_FILE)
+        self.history = HistoryStore(HISTORY_FILE)
+        self.mirror = CalendarMirror(self.history, self.journal, on_changed=lambda: self._notify('history'))
+        self.sync_worker = CalendarSyncWorker(self.journal, self.get_sync_target, self.on_calendar_missing, self.mirror)
+        # Autocomplete for task names.
+        self.task_index = TaskIndex()
+
+        # Connects, diffs and rate-limits on its own thread; never blocks callers.
+        self.presence = PresenceWorker(discord_client_id) if discord_client_id else None
+
+        # Once a segment is journaled, everything else hears about it through
+        # the bus, each destination on its own worker.
+        self.bus = EventBus()
+        self.bus.add(CalendarSink(self.sync_worker))
+        self.bus.add(HistorySink(self.history, self.task_index, on_recorded=lambda: self._notify('history')))
+        self.bus.add(PresenceSink(lambda: self.presence))
+        # Optional extra destinations (see sinks.py).
+        webhook_url = os.getenv('CLOCKIN_WEBHOOK_URL')
+        if webhook_url:
+            self.bus.add(WebhookSink(webhook_url))
+        export_file = os.getenv('CLOCKIN_EXPORT_FILE')
+        if export_file:
+            self.bus.add(FileExportSink(export_file))
+
+        self.metrics_writer = SnapshotWriter(get_extra=self.counters)
+
+    def start(self):
+        """Starts the background work: syncing, loading past tasks and connecting to Google."""
+        self.sync_worker.start()
+        self.metrics_writer.start()
+        threading.Thread(target=self.load_task_index, args=(time.time(),), name="task-index", daemon=True).start()
+        self.executor.submit(self.connect_in_background)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _notify(self, change):
+        for listener in self._listeners:
+            try:
+                listener(change)
+            except Exception:
+                log.exception(f"Listener failed on {change}")
+
+    def load_task_index(self, until):
+        # Tasks finished after `until` are recorded into the index as they happen.
+        self.task_index.load(self.history.task_uses(until))
+        log.info(f"Task index loaded: {len(self.task_index)} task(s)")
+
+    # Google connection
+
+    def connect_in_background(self):
+        # Runs on the executor.
+        try:
+            connection = self.load_credentials()
+        except Exception as e:
+            log.warning(f"Failed to connect to Google: {e}")
+            connection = None
+        self.finish_connecting(connection)
+
+    def load_credentials(self):
+        log.debug("Loading credentials...")
+        if not os.path.exists(CREDENTIALS_FILE):
+            return None
+        from google.oauth2.credentials import Credentials
+        with open(CREDENTIALS_FILE, 'r') as token:
+            token_data = json.load(token)
+        credentials = Credentials.from_authorized_user_info(token_data, SCOPES)
+        # An expired access token is fine here: the token refresher renews it in
+        # the background and the transport refreshes on demand.
+        if not credentials.valid and not credentials.refresh_token:
+            return None
+        log.debug("Credentials loaded.")
+        return self.connect(credentials, token_data.get('email'))
+
+    def connect(self, credentials, cached_email=None):
+        calendar_service = build_service('calendar', 'v3', credentials)
+        user_email = self.get_user_email(credentials, cached_email)
+        # Persist refreshed tokens along with the email so the next launch needs no lookup.
+        self.save_credentials(credentials, user_email)
+        calendar_id = self.create_clockin_calendar(calendar_service, user_email)
+        return credentials, calendar_service, user_email, calendar_id
+
+    def finish_connecting(self, connection):
+        with self._lock:
+            if connection:
+                self.credentials, self.calendar_service, self.user_email, self.calendar_id = connection
+                self.start_token_refresher()
+                self.sync_worker.wake(mirror=True)
+            self.connecting = False
+        self._notify('connection')
+
+    def start_token_refresher(self):
+        if self.token_refresher:
+            self.token_refresher.stop()
+        credentials, user_email = self.credentials, self.user_email
+        self.token_refresher = TokenRefresher(
+            credentials,
+            shared_http(credentials),
+            on_refreshed=lambda refreshed: self.handle_credentials_refreshed(refreshed, user_email),
+            on_revoked=lambda: self.handle_credentials_revoked(credentials),
+        )
+        self.token_refresher.start()
+
+    def handle_credentials_refreshed(self, credentials, user_email):
+        # A sign-out or account switch during the refresh must not bring the old token back.
+        with self._lock:
+            if credentials is not self.credentials:
+                return
+            self.save_credentials(credentials, user_email)
+
+    def handle_credentials_revoked(self, credentials):
+        with self._lock:
+            if credentials is not self.credentials:
+                return
+            self.forget_credentials()
+        self._notify('revoked')
+
+    def save_credentials(self, credentials, user_email=None):
+        # Written to a temp file and swapped in, so a crash never leaves a torn token.json.
+        log.debug("Saving credentials...")
+        token_data = json.loads(credentials.to_json())
+        if user_email:
+            token_data['email'] = user_email
+        tmp_path = CREDENTIALS_FILE + '.tmp'
+        with open(tmp_path, 'w') as token:
+            json.dump(token_data, token)
+            token.flush()
+            os.fsync(token.fileno())
+        os.replace(tmp_path, CREDENTIALS_FILE)
+        log.debug("Credentials saved.")
+
+    def forget_credentials(self):
+        with self._lock:
+            if self.token_refresher:
+                self.token_refresher.stop()
+                self.token_refresher = None
+            if os.path.exists(CREDENTIALS_FILE):
+                os.remove(CREDENTIALS_FILE)
+            self.credentials = None
+            self.calendar_service = None
+            self.calendar_id = None
+            self.user_email = None
+        self._notify('connection')
+
+    def sign_out(self):
+        log.debug("Signing out...")
+        self.forget_credentials()
+        log.debug("Signed out.")
+
+    def sign_in(self):
+        """Runs the browser sign-in flow in the background."""
+        log.debug("Signing in with Google...")
+        with self._lock:
+            self.connecting = True
+        self._notify('connection')
+        # The browser flow waits on the user, so it gets its own thread rather
+        # than holding up the Google executor.
+        threading.Thread(target=self.run_sign_in_flow, name="sign-in", daemon=True).start()
+
+    def run_sign_in_flow(self):
+        try:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
+            # Gives up if the user closes the tab instead of finishing.
+            credentials = flow.run_local_server(port=0, timeout_seconds=SIGN_IN_TIMEOUT_SECONDS)
+        except Exception as e:
+            log.warning(f"Failed to sign in with Google: {e}")
+            self.finish_connecting(None)
+            return
+        self.executor.submit(self.finish_sign_in, credentials)
+
+    def finish_sign_in(self, credentials):
+        # Runs on the executor.
+        try:
+            connection = self.connect(credentials)
+        except Exception as e:
+            log.warning(f"Failed to sign in with Google: {e}")
+            connection = None
+        self.finish_connecting(connection)
+        if connection:
+            log.info("Signed in with Google.")
+            self._notify('signed_in')
+
+    def get_user_email(self, credentials, cached_email=None):
+        log.debug("Getting user email...")
+        # Sign-in and refresh both hand back an OpenID ID token carrying the email.
+        if credentials.id_token:
+            user_email = email_from_id_token(credentials.id_token, credentials.client_id)
+            if user_email:
+                log.debug(f"User email: {user_email}")
+                return user_email
+        if cached_email:
+            log.debug(f"User email: {cached_email}")
+            return cached_email
+        # Last resort: ask the userinfo endpoint.
+        try:
+            service = build_service('oauth2', 'v2', credentials)
+            with timed('google.userinfo'):
+                user_info = service.userinfo().get().execute()
+            log.debug(f"User email: {user_info['email']}")
+            return user_info['email']
+        except Exception as e:
+            log.warning(f"An error occurred while getting user email: {e}")
+            return None
+
+    def create_clockin_calendar(self, calendar_service, user_email):
+        log.debug("Creating cLockIn calendar if it doesn't exist...")
+        calendar_id, fresh = self.calendar_cache.get(user_email)
+        if calendar_id and fresh:
+            log.info(f"Using cached cLockIn calendar ID: {calendar_id}")
+            return calendar_id
+        if calendar_id:
+            try:
+                with timed('calendar.calendars_get'):
+                    calendar_service.calendars().get(calendarId=calendar_id, fields='id').execute()
+                self.calendar_cache.put(user_email, calendar_id)
+                log.info(f"Verified cached cLockIn calendar ID: {calendar_id}")
+                return calendar_id
+            except Exception as e:
+                if http_status(e) != 404:
+                    # Can't tell right now; keep using it and verify next launch.
+                    log.warning(f"Could not verify cached calendar ID: {e}")
+                    return calendar_id
+                log.warning("Cached cLockIn calendar no longer exists.")
+                self.calendar_cache.invalidate(user_email)
+
+        calendar_id = self.find_clockin_calendar(calendar_service)
+        if calendar_id:
+            log.info(f"cLockIn calendar already exists with ID: {calendar_id}")
+        else:
+            calendar = {
+                'summary': CALENDAR_TITLE,
+                'timeZone': 'UTC'
+            }
+            with timed('calendar.calendars_insert'):
+                calendar_id = calendar_service.calendars().insert(body=calendar, fields='id').execute()['id']
+            log.info(f"cLockIn calendar created with ID: {calendar_id}")
+        self.calendar_cache.put(user_email, calendar_id)
+        return calendar_id
+
+    @staticmethod
+    def find_clockin_calendar(calendar_service):
+        page_token = None
+        while True:
+            with timed('calendar.calendar_list'):
+                page = calendar_service.calendarList().list(
+                    minAccessRole='owner',
+                    maxResults=250,
+                    pageToken=page_token,
+                    fields='nextPageToken,items(id,summary)',
+                ).execute()
+            for calendar_entry in page.get('items', []):
+                if calendar_entry.get('summary') == CALENDAR_TITLE:
+                    return calendar_entry['id']
+            page_token = page.get('nextPageToken')
+            if not page_token:
+                return None
+
+    def on_calendar_missing(self):
+        # Called from the sync worker when inserts come back 404.
+        log.debug("cLockIn calendar is gone, resolving it again...")
+        self.calendar_cache.invalidate(self.user_email)
+        self.executor.submit(self.resolve_calendar_in_background, self.calendar_service, self.user_email)
+
+    def resolve_calendar_in_background(self, calendar_service, user_email):
+        try:
+            calendar_id = self.create_clockin_calendar(calendar_service, user_email)
+        except Exception as e:
+            log.warning(f"Failed to resolve cLockIn calendar: {e}")
+            return
+        with self._lock:
+            if self.calendar_service is calendar_service:
+                self.calendar_id = calendar_id
+                self.sync_worker.wake(mirror=True)
+
+    def get_sync_target(self):
+        return self.calendar_service, self.calendar_id
+
+    # The tracked session
+
+    def _require_signed_in(self):
+        if not self.credentials:
+            raise ClockInError("Sign in first")
+
+    def start_task(self, summary=None):
+        """Starts tracking `summary`, or resumes the paused task if no summary is given.
+
+        Starting a different task finishes the current one first; starting
+        the task that is already set resumes it.
+        """
+        with timed('action.start'), self._lock:
+            self._require_signed_in()
+            if summary is not None:
+                summary = summary.strip()
+                if not summary:
+                    raise ClockInError("Set a task first")
+                if self.session and self.session.summary != summary:
+                    self._finish_session()
+                if not self.session:
+                    self.session = Session(summary)
+            elif not self.session:
+                raise ClockInError("Set a task first")
+            if not self.session.is_running:
+                self.session.start()
+                log.info(f"Started working on {self.session.summary}")
+                self._publish('start', running_since=self.session.running_since)
+            self._notify('session')
+            return self.status()
+
+    def pause_task(self):
+        with timed('action.pause'), self._lock:
+            self._require_signed_in()
+            if not self.session or not self.session.is_running:
+                raise ClockInError("Start an event first")
+            self._publish('pause', **self._journal_segment(self.session.pause()))
+            log.info(f"Paused working on {self.session.summary}")
+            self._notify('session')
+            return self.status()
+
+    def stop_task(self):
+        with timed('action.stop'), self._lock:
+            self._require_signed_in()
+            self._finish_session()
+            self._notify('session')
+            return self.status()
+
+    def _finish_session(self):
+        if not self.session:
+            return
+        # A paused session has nothing left to journal.
+        segment = self._journal_segment(self.session.pause()) if self.session.is_running else {}
+        self._publish('stop', **segment)
+        self.session = None
+
+    def _publish(self, kind, **details):
+        self.bus.publish(SessionEvent(kind, self.session.summary, time.time(), **details))
+
+    def _journal_segment(self, segment):
+        # The only synchronous write: once this returns the segment survives
+        # a crash, and the sinks pick it up from the published event.
+        start, end = segment
+        gap = self.coalesce_gap_seconds
+        if gap > 0 and self.session.continues_event(segment, gap):
+            # A short break: stretch the previous event over it rather than adding a fragment.
+            event_id = self.session.event_id
+            self.journal.extend(event_id, end)
+            new_event = False
+        else:
+            event_id = new_event_id()
+            self.journal.append(event_id, {'summary': self.session.summary, 'start': start, 'end': end})
+            self.session.event_id = event_id
+            self.session.event_start = start
+            new_event = True
+        self.session.event_end = end
+        log.debug(f"Event {event_id} journaled for sync.")
+        return {'event_id': event_id, 'event_start': self.session.event_start, 'event_end': end,
+                'new_event': new_event, 'segment_start': start}
+
+    def set_discord_client_id(self, client_id):
+        """Turns Discord presence on for `client_id`, or off if it is None."""
+        with self._lock:
+            if client_id and self.presence is None:
+                self.presence = PresenceWorker(client_id)
+                # Only the new presence needs to hear about the running task.
+                if self.session and self.session.is_running:
+                    PresenceSink.show(self.presence, self.session.summary, self.session.running_since)
+            elif not client_id and self.presence:
+                self.presence.stop()
+                self.presence = None
+
+    def status(self):
+        with self._lock:
+            session = self.session
+            return {
+                'signed_in': bool(self.credentials),
+                'connecting': self.connecting,
+                'email': self.user_email,
+                'task': session.summary if session else None,
+                'running': bool(session and session.is_running),
+                'segment_elapsed': session.segment_elapsed() if session else 0.0,
+                'elapsed': session.elapsed() if session else 0.0,
+                'pending_sync': len(self.journal),
+            }
+
+    def counters(self):
+        return {
+            'sync': {'pending': len(self.journal), 'last_flush': self.sync_worker.last_flush,
+                     'totals': dict(self.sync_worker.totals)},
+            'sinks': self.bus.stats(),
+        }
+
+    def metrics(self):
+        """Latency histograms plus sync and sink counters, as served over the control socket."""
+        return dict(self.counters(), latency=snapshot())
+
+    def close(self):
+        with self._lock:
+            self.bus.close()
+            self.sync_worker.stop()
+            # Last, so the final snapshot counts what the sinks drained.
+            self.metrics_writer.stop()
+            if self.token_refresher:
+                self.token_refresher.stop()
+            if self.presence:
+                self.presence.stop()
+            self.executor.shutdown(wait=False)
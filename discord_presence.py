@@ -0,0 +1,128 @@
+"""Discord rich presence on its own asyncio thread.
+
+The menu bar only calls set() and clear(), which record the state Discord
+should show and return immediately. The worker sends that state only when
+it differs from what Discord last received, stays inside Discord's rate
+limit, and reconnects with backoff when Discord is slow or not running.
+"""
+import collections
+import logging
+import threading
+
+from metrics import timed
+
+log = logging.getLogger(__name__)
+
+# Discord accepts at most 5 activity updates per 20 seconds.
+RATE_LIMIT_UPDATES = 5
+RATE_LIMIT_WINDOW_SECONDS = 20
+RECONNECT_MIN_SECONDS = 5
+RECONNECT_MAX_SECONDS = 5 * 60
+TIMEOUT_SECONDS = 10
+
+_NOTHING_SENT = object()
+
+
+class PresenceWorker:
+    def __init__(self, client_id):
+        # asyncio is only imported once Discord is turned on, to keep it off the launch path.
+        import asyncio
+        self.client_id = client_id
+        self._desired = None  # kwargs for AioPresence.update, or None to clear
+        self._loop = asyncio.new_event_loop()
+        self._changed = asyncio.Event()
+        self._stopped = asyncio.Event()
+        self._thread = threading.Thread(target=self._loop.run_until_complete, args=(self._main(),),
+                                        name="discord-presence", daemon=True)
+        self._thread.start()
+
+    def set(self, **activity):
+        self._desired = activity
+        self._loop.call_soon_threadsafe(self._changed.set)
+
+    def clear(self):
+        self._desired = None
+        self._loop.call_soon_threadsafe(self._changed.set)
+
+    def stop(self):
+        """Clears the presence and shuts the worker down without waiting for it."""
+        self._desired = None
+        self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def _sleep(self, seconds):
+        # Returns True if the worker was stopped while sleeping.
+        import asyncio
+        try:
+            await asyncio.wait_for(self._stopped.wait(), seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _wait_for_change(self):
+        import asyncio
+        changed = asyncio.ensure_future(self._changed.wait())
+        stopped = asyncio.ensure_future(self._stopped.wait())
+        await asyncio.wait([changed, stopped], return_when=asyncio.FIRST_COMPLETED)
+        changed.cancel()
+        stopped.cancel()
+        self._changed.clear()
+
+    async def _main(self):
+        import asyncio
+        from pypresence import AioPresence
+
+        rpc = None
+        sent = _NOTHING_SENT
+        sent_at = collections.deque(maxlen=RATE_LIMIT_UPDATES)
+        backoff = None
+        while not self._stopped.is_set():
+            if rpc is None:
+                try:
+                    rpc = AioPresence(self.client_id, loop=self._loop)
+                    with timed('discord.connect'):
+                        await asyncio.wait_for(rpc.connect(), TIMEOUT_SECONDS)
+                    log.info("Connected to Discord.")
+                    sent = _NOTHING_SENT
+                    backoff = None
+                except Exception as e:
+                    rpc = None
+                    backoff = min(RECONNECT_MAX_SECONDS, backoff * 2) if backoff else RECONNECT_MIN_SECONDS
+                    log.warning(f"Failed to connect to Discord, retrying in {backoff}s: {e}")
+                    await self._sleep(backoff)
+                    continue
+
+            desired = self._desired
+            if desired == sent:
+                await self._wait_for_change()
+                continue
+            if len(sent_at) == RATE_LIMIT_UPDATES:
+                wait = sent_at[0] + RATE_LIMIT_WINDOW_SECONDS - self._loop.time()
+                if wait > 0:
+                    # Whatever is desired once the window opens gets sent; states in between are skipped.
+                    await self._sleep(wait)
+                    continue
+            try:
+                with timed('discord.update'):
+                    if desired is None:
+                        await asyncio.wait_for(rpc.clear(), TIMEOUT_SECONDS)
+                    else:
+                        await asyncio.wait_for(rpc.update(**desired), TIMEOUT_SECONDS)
+                sent = desired
+                sent_at.append(self._loop.time())
+            except Exception as e:
+                log.warning(f"Discord update failed, reconnecting: {e}")
+                self._disconnect(rpc)
+                rpc = None
+
+        if rpc is not None:
+            if sent is not None and sent is not _NOTHING_SENT:
+                try:
+                    await asyncio.wait_for(rpc.clear(), TIMEOUT_SECONDS)
+                except Exception as e:
+                    log.warning(f"Failed to clear Discord presence: {e}")
+            self._disconnect(rpc)
+
+    def _disconnect(self, rpc):
+        # AioPresence.close() would also close our event loop, so just drop the socket.
+        if rpc.sock_writer is not None:
+            rpc.sock_writer.close()
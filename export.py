@@ -0,0 +1,123 @@
+"""Streams finished sessions out to ICS, CSV or JSON Lines.
+
+A source yields (event_id, summary, start, end) one event at a time and
+write_events() writes each one as it arrives. Memory therefore stays flat
+however much history is exported. There are two sources:
+
+- calendar_events() pages through events().list on the cLockIn calendar.
+- HistoryStore.segments() reads the local history in batches.
+
+Both sources keep events that started in [first, last) and whose summary
+contains the task, ignoring case. The history applies both filters in its
+SQL query. Google gets the date range as timeMin/timeMax, so events
+outside it are never fetched. The task is matched here instead: Calendar's
+q is a full-text search for whole words across several fields, so it
+would miss "Review PR" for the task "view".
+"""
+import datetime
+import json
+import logging
+import os
+
+from calendar_mirror import event_time
+from formats import CSV_FIELDS, ICS_FOOTER, ICS_HEADER, csv_line, csv_row, ics_event, json_line
+from metrics import timed
+
+log = logging.getLogger(__name__)
+
+# events().list allows up to 2500 per page; fewer, larger pages mean fewer round trips.
+PAGE_SIZE = 2500
+EVENT_FIELDS = 'nextPageToken,items(id,status,summary,start,end)'
+# Format -> (header, line for one event, footer).
+FORMATS = {
+    'ics': (ICS_HEADER, ics_event, ICS_FOOTER),
+    'csv': (csv_line(CSV_FIELDS), lambda *event: csv_line(csv_row(*event)), ''),
+    'jsonl': ('', json_line, ''),
+}
+EXTENSIONS = {'.ics': 'ics', '.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+def _rfc3339(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+def format_for(path, default='csv'):
+    """Picks the format from a file name's extension."""
+    return EXTENSIONS.get(os.path.splitext(path or '')[1].lower(), default)
+
+
+def open_calendar():
+    """Returns (calendar_service, calendar_id) for the account in token.json, without starting the app."""
+    from google.oauth2.credentials import Credentials
+    from calendar_cache import CalendarIdCache
+    from core import CALENDAR_CACHE_FILE, CREDENTIALS_FILE, SCOPES, ClockInCore, ClockInError
+    from google_api import build_service
+
+    if not os.path.exists(CREDENTIALS_FILE):
+        raise ClockInError("Sign in first")
+    with open(CREDENTIALS_FILE, 'r') as token:
+        token_data = json.load(token)
+    # The app's token refresher owns token.json; a token refreshed here stays in memory.
+    credentials = Credentials.from_authorized_user_info(token_data, SCOPES)
+    service = build_service('calendar', 'v3', credentials)
+    calendar_id, _ = CalendarIdCache(CALENDAR_CACHE_FILE).get(token_data.get('email'))
+    if not calendar_id:
+        calendar_id = ClockInCore.find_clockin_calendar(service)
+    if not calendar_id:
+        raise ClockInError("There is no cLockIn calendar to export")
+    return service, calendar_id
+
+
+def calendar_events(service, calendar_id, first=None, last=None, task=None):
+    """Yields (event_id, summary, start, end) from Google Calendar, oldest first, one page at a time."""
+    params = {'calendarId': calendar_id, 'maxResults': PAGE_SIZE, 'singleEvents': True, 'orderBy': 'startTime',
+              'fields': EVENT_FIELDS}
+    if first is not None:
+        params['timeMin'] = _rfc3339(first)
+    if last is not None:
+        params['timeMax'] = _rfc3339(last)
+    while True:
+        with timed('calendar.events_list'):
+            page = service.events().list(**params).execute()
+        for item in page.get('items', []):
+            start, end = event_time(item.get('start')), event_time(item.get('end'))
+            if item.get('status') == 'cancelled' or start is None or end is None:
+                continue
+            summary = item.get('summary', '')
+            # timeMin also lets through events that started earlier and are still running.
+            if first is not None and start < first:
+                continue
+            if task and task.casefold() not in summary.casefold():
+                continue
+            yield item['id'], summary, start, end
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return
+        params['pageToken'] = page_token
+
+
+def write_events(events, export_format, out):
+    """Writes each event to the text stream `out` as it arrives; returns how many were written."""
+    header, line, footer = FORMATS[export_format]
+    out.write(header)
+    count = 0
+    for event in events:
+        out.write(line(*event))
+        count += 1
+    out.write(footer)
+    return count
+
+
+def export_to_file(events, export_format, path):
+    """Like write_events(), but into a temp file that replaces `path` only once it is complete."""
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as export_file:
+            count = write_events(events, export_format, export_file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    log.info(f"Exported {count} event(s) to {path}")
+    return count
@@ -0,0 +1,72 @@
+"""Text formats for finished calendar events, shared by the exporters.
+
+Each event is (event_id, summary, start, end), with times as epoch
+seconds. CSV and JSON Lines use local ISO 8601 times with an offset, and
+ICS uses UTC.
+"""
+import csv
+import datetime
+import io
+import json
+
+ICS_HEADER = 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//cLockIn//EN\r\n'
+ICS_FOOTER = 'END:VCALENDAR\r\n'
+CSV_FIELDS = ('event_id', 'summary', 'start', 'end', 'seconds')
+
+
+def _local_iso(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).astimezone().isoformat(timespec='seconds')
+
+
+def _ics_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _ics_text(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_fold(line):
+    # Content lines are limited to 75 octets; longer ones continue on lines
+    # starting with a space. Never split a UTF-8 sequence.
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74  # room for the leading space
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ics_event(event_id, summary, start, end):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:{event_id}@clockin',
+        f'DTSTAMP:{_ics_time(end)}',
+        f'DTSTART:{_ics_time(start)}',
+        f'DTEND:{_ics_time(end)}',
+        f'SUMMARY:{_ics_text(summary)}',
+        'END:VEVENT',
+    ]
+    return ''.join(_ics_fold(line) for line in lines)
+
+
+def csv_row(event_id, summary, start, end):
+    return [event_id, summary, _local_iso(start), _local_iso(end), round(end - start)]
+
+
+def csv_line(row):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+
+def json_line(event_id, summary, start, end):
+    return json.dumps({'event_id': event_id, 'summary': summary, 'start': _local_iso(start),
+                       'end': _local_iso(end), 'seconds': round(end - start)}) + '\n'
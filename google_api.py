@@ -0,0 +1,55 @@
+"""Builds Google API service objects without a discovery round trip.
+
+googleapiclient ships the discovery documents for its APIs. Each one is
+read and parsed once per process, and each service is built once per
+credentials object and reused after that. All services for one set of
+credentials share a single pooled transport (see transport.py).
+"""
+import json
+import threading
+
+_lock = threading.Lock()
+_documents = {}
+_services = {}  # (name, version) -> (credentials, service)
+_http = None  # (credentials, SessionHttp)
+
+
+def shared_http(credentials):
+    """Returns the pooled transport for these credentials, replacing any older one."""
+    global _http
+    with _lock:
+        if _http and _http[0] is credentials:
+            return _http[1]
+        from transport import SessionHttp
+        if _http:
+            _http[1].close()
+        _http = (credentials, SessionHttp(credentials))
+        return _http[1]
+
+
+def discovery_document(name, version):
+    with _lock:
+        if (name, version) not in _documents:
+            from googleapiclient.discovery_cache import get_static_doc
+            content = get_static_doc(name, version)
+            _documents[(name, version)] = json.loads(content) if content else None
+        return _documents[(name, version)]
+
+
+def build_service(name, version, credentials):
+    with _lock:
+        cached = _services.get((name, version))
+    if cached and cached[0] is credentials:
+        return cached[1]
+    http = shared_http(credentials)
+    document = discovery_document(name, version)
+    if document is not None:
+        from googleapiclient.discovery import build_from_document
+        service = build_from_document(document, http=http)
+    else:
+        # Older googleapiclient without bundled documents: fetch it, skip the file cache.
+        from googleapiclient.discovery import build
+        service = build(name, version, http=http, cache_discovery=False)
+    with _lock:
+        _services[(name, version)] = (credentials, service)
+    return service
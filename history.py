@@ -0,0 +1,248 @@
+"""Local SQLite history of finished sessions.
+
+Every journaled event is also recorded here, so time reports never need the
+network. Segments are indexed by task and by start time, and per-day,
+per-task totals are maintained as segments are written. A report over any
+date range therefore only reads one row per day and task.
+
+A coalesced event spans the short breaks between its segments. Totals only
+count the time actually worked, so an event with breaks keeps its worked
+parts in a separate table; an event without any is worked end to end.
+"""
+import datetime
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    event_id TEXT PRIMARY KEY,
+    summary TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    -- The Google calendar the event was mirrored from; NULL until it is.
+    calendar_id TEXT
+);
+CREATE INDEX IF NOT EXISTS segments_by_summary ON segments (summary, start);
+CREATE INDEX IF NOT EXISTS segments_by_start ON segments (start);
+CREATE TABLE IF NOT EXISTS worked (
+    event_id TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS worked_by_event ON worked (event_id);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (day, summary)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def day_slices(start, end):
+    """Splits [start, end) at local midnights into (YYYY-MM-DD, seconds) pairs."""
+    current = datetime.datetime.fromtimestamp(start)
+    finish = datetime.datetime.fromtimestamp(end)
+    while current < finish:
+        next_midnight = datetime.datetime.combine(current.date() + datetime.timedelta(days=1), datetime.time())
+        slice_end = min(next_midnight, finish)
+        yield current.date().isoformat(), (slice_end - current).total_seconds()
+        current = slice_end
+
+
+def clip(parts, start, end):
+    """Cuts [(start, end)] parts down to the span [start, end)."""
+    return [(max(part_start, start), min(part_end, end)) for part_start, part_end in parts
+            if min(part_end, end) > max(part_start, start)]
+
+
+def _same_time(local, mirrored):
+    # Google Calendar keeps whole seconds, so our own events come back up to 1s off.
+    return abs(local - mirrored) < 1
+
+
+def format_duration(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes = remainder // 60
+    return f"{hours}h {minutes}m" if hours >= 1 else f"{minutes}m"
+
+
+class HistoryStore:
+    def __init__(self, path):
+        # Shared by the main thread and background workers; the lock serializes them.
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        # SQLite's lower() only folds ASCII; match tasks the way the Calendar export does.
+        self._conn.create_function('casefold', 1, str.casefold, deterministic=True)
+
+    def _add_to_totals(self, summary, parts, sign):
+        for start, end in parts:
+            for day, seconds in day_slices(start, end):
+                self._conn.execute(
+                    "INSERT INTO daily_totals (day, summary, seconds) VALUES (?, ?, ?) "
+                    "ON CONFLICT (day, summary) DO UPDATE SET seconds = seconds + excluded.seconds",
+                    (day, summary, sign * seconds),
+                )
+
+    def _worked(self, event_id, start, end):
+        parts = self._conn.execute("SELECT start, end FROM worked WHERE event_id = ? ORDER BY start",
+                                   (event_id,)).fetchall()
+        return parts or [(start, end)]
+
+    def _remove(self, event_id):
+        old = self._conn.execute("SELECT summary, start, end FROM segments WHERE event_id = ?", (event_id,)).fetchone()
+        if not old:
+            return False
+        summary, start, end = old
+        self._add_to_totals(summary, self._worked(event_id, start, end), sign=-1)
+        self._conn.execute("DELETE FROM segments WHERE event_id = ?", (event_id,))
+        self._conn.execute("DELETE FROM worked WHERE event_id = ?", (event_id,))
+        return True
+
+    def _record(self, event_id, summary, start, end, segment=None, calendar_id=None):
+        old = self._conn.execute("SELECT summary, start, end, calendar_id FROM segments WHERE event_id = ?",
+                                 (event_id,)).fetchone()
+        if old is None:
+            parts = [segment or (start, end)]
+        else:
+            old_summary, old_start, old_end, old_calendar_id = old
+            calendar_id = calendar_id or old_calendar_id
+            unchanged = old_summary == summary and _same_time(old_start, start) and _same_time(old_end, end)
+            if unchanged and segment is None:
+                if calendar_id != old_calendar_id:
+                    self._conn.execute("UPDATE segments SET calendar_id = ? WHERE event_id = ?", (calendar_id, event_id))
+                return False
+            old_parts = self._worked(event_id, old_start, old_end)
+            if segment:
+                # Worked time before this segment stands; the gap up to it was a break.
+                parts = clip(old_parts, start, segment[0]) + [segment]
+            else:
+                # Edited in Google Calendar: keep the breaks inside the new span,
+                # and count any time it was stretched by as worked.
+                parts = clip(old_parts, start, end)
+                if start < old_start:
+                    parts.insert(0, (start, min(old_start, end)))
+                if end > old_end:
+                    parts.append((max(old_end, start), end))
+            self._remove(event_id)
+        self._conn.execute("INSERT INTO segments (event_id, summary, start, end, calendar_id) VALUES (?, ?, ?, ?, ?)",
+                           (event_id, summary, start, end, calendar_id))
+        if parts != [(start, end)]:
+            self._conn.executemany("INSERT INTO worked (event_id, start, end) VALUES (?, ?, ?)",
+                                   [(event_id, part_start, part_end) for part_start, part_end in parts])
+        self._add_to_totals(summary, parts, sign=1)
+        return True
+
+    def record(self, event_id, summary, start, end, segment=None):
+        """Adds an event, or replaces it (e.g. after it was extended).
+
+        `segment` is the worked (start, end) that just brought the event to
+        this span. The gap between it and the event's earlier segments is a
+        break and is left out of the totals.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._record(event_id, summary, start, end, segment)
+
+    def delete(self, event_id):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._remove(event_id)
+
+    def apply_changes(self, upserts, deletions, calendar_id=None):
+        """Applies [(event_id, summary, start, end)] and [event_id] in one transaction.
+
+        Upserted events are tagged with `calendar_id`, if given. Returns how
+        many events actually changed.
+        """
+        changed = 0
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            for row in upserts:
+                changed += self._record(*row, calendar_id=calendar_id)
+            for event_id in deletions:
+                changed += self._remove(event_id)
+        return changed
+
+    def event_ids(self, calendar_id=None):
+        """Returns every event's ID, or only those mirrored from `calendar_id`."""
+        with self._lock:
+            if calendar_id is None:
+                return {row[0] for row in self._conn.execute("SELECT event_id FROM segments")}
+            return {row[0] for row in self._conn.execute("SELECT event_id FROM segments WHERE calendar_id = ?",
+                                                         (calendar_id,))}
+
+    def task_uses(self, until):
+        """Returns [(summary, end)] for every event that ended by `until`."""
+        with self._lock:
+            return self._conn.execute("SELECT summary, end FROM segments WHERE end <= ?", (until,)).fetchall()
+
+    def segments(self, first=None, last=None, task=None, batch_size=500):
+        """Yields (event_id, summary, start, end) for events that started in [first, last), oldest first.
+
+        `task` keeps summaries containing it, ignoring case. Rows are read a
+        batch at a time, so memory stays flat and writers wait for one batch
+        at most.
+        """
+        conditions = ["(start > ? OR (start = ? AND event_id > ?))"]
+        params = []
+        if first is not None:
+            conditions.append("start >= ?")
+            params.append(first)
+        if last is not None:
+            conditions.append("start < ?")
+            params.append(last)
+        if task:
+            conditions.append("instr(casefold(summary), ?) > 0")
+            params.append(task.casefold())
+        query = (f"SELECT event_id, summary, start, end FROM segments WHERE {' AND '.join(conditions)} "
+                 "ORDER BY start, event_id LIMIT ?")
+        after_start, after_id = float('-inf'), ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(query, (after_start, after_start, after_id, *params, batch_size)).fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            after_id, _, after_start, _ = rows[-1]
+
+    def totals(self, first_day, last_day):
+        """Returns [(summary, seconds)] for local dates first_day..last_day, longest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT summary, SUM(seconds) FROM daily_totals WHERE day BETWEEN ? AND ? "
+                "GROUP BY summary HAVING SUM(seconds) > 0.5 ORDER BY SUM(seconds) DESC",
+                (first_day.isoformat(), last_day.isoformat()),
+            ).fetchall()
+
+    def today(self):
+        today = datetime.date.today()
+        return self.totals(today, today)
+
+    def this_week(self):
+        today = datetime.date.today()
+        return self.totals(today - datetime.timedelta(days=today.weekday()), today)
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            if value is None:
+                self._conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+            else:
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
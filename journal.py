@@ -0,0 +1,147 @@
+"""Append-only, fsync'd journal of finished session segments.
+
+Every segment is written here before anything touches the network, so a
+crash or a dead connection never loses a session. The file holds one JSON
+record per line:
+
+    {"op": "insert", "id": "<event id>", "segment": {"summary": ..., "start": ..., "end": ...}}
+    {"op": "extend", "id": "<event id>", "end": ...}
+    {"op": "synced", "id": "<event id>", "end": ...}
+
+"extend" moves the end of an event that is already journaled, which is how
+coalesced pause/resume segments stretch one calendar event. "synced" records
+the end time Google now has, so an extension that arrived while the insert
+was in flight is still sent afterwards as a patch.
+
+Replaying the file on startup yields the operations that still have to
+reach Google Calendar. Segment times are epoch seconds; session.event_body
+turns them into a Calendar request body at flush time.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+
+log = logging.getLogger(__name__)
+
+# Rewrite the file once it holds this many records nobody needs anymore.
+COMPACT_AFTER = 256
+
+
+def new_event_id():
+    # Calendar event IDs must be base32hex (a-v, 0-9). A hex uuid4 fits, and
+    # generating it on the client lets every retry reuse the same ID.
+    return uuid.uuid4().hex
+
+
+class SessionJournal:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # event id -> (op, segment), in journal order. op is 'insert' for events
+        # Google has never seen, or 'patch' for ones whose end moved after the
+        # insert went through (the segment then only holds 'end').
+        self._pending = {}
+        self._dead_records = 0
+        self._replay()
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as journal_file:
+            data = journal_file.read()
+            # A crash mid-write leaves a torn last line; drop it so the next
+            # append starts on a clean line.
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                log.warning(f"Dropping {len(data) - end} bytes of torn journal record")
+                journal_file.truncate(end)
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self._apply(record)
+        log.info(f"Journal replayed: {len(self._pending)} pending operation(s)")
+
+    def _apply(self, record):
+        op, event_id = record['op'], record['id']
+        entry = self._pending.get(event_id)
+        if op == 'insert':
+            self._pending[event_id] = ('insert', record['segment'])
+        elif op == 'extend':
+            if entry:
+                self._pending[event_id] = (entry[0], dict(entry[1], end=record['end']))
+            else:
+                self._pending[event_id] = ('patch', {'end': record['end']})
+            self._dead_records += 1
+        elif op == 'synced' and entry:
+            self._dead_records += 2
+            if 'end' in record and record['end'] != entry[1]['end']:
+                # Extended while the request was in flight; Google still needs the new end.
+                self._pending[event_id] = ('patch', {'end': entry[1]['end']})
+            else:
+                del self._pending[event_id]
+
+    def _write(self, records):
+        payload = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+        os.write(self._fd, payload.encode('utf-8'))
+        os.fsync(self._fd)
+
+    def _log(self, records):
+        self._write(records)
+        for record in records:
+            self._apply(record)
+
+    def append(self, event_id, segment):
+        with self._lock:
+            self._log([{'op': 'insert', 'id': event_id, 'segment': segment}])
+
+    def extend(self, event_id, end):
+        with self._lock:
+            self._log([{'op': 'extend', 'id': event_id, 'end': end}])
+
+    def mark_synced(self, sent):
+        """Records that each (event id, segment) pair in `sent` reached Google."""
+        with self._lock:
+            records = [{'op': 'synced', 'id': event_id, 'end': segment['end']}
+                       for event_id, segment in sent if event_id in self._pending]
+            if not records:
+                return
+            self._log(records)
+            if not self._pending:
+                os.ftruncate(self._fd, 0)
+                os.fsync(self._fd)
+                self._dead_records = 0
+            elif self._dead_records >= COMPACT_AFTER:
+                self._compact()
+
+    def _compact(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as tmp_file:
+            for event_id, (op, segment) in self._pending.items():
+                if op == 'insert':
+                    record = {'op': 'insert', 'id': event_id, 'segment': segment}
+                else:
+                    record = {'op': 'extend', 'id': event_id, 'end': segment['end']}
+                tmp_file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, self.path)
+        os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._dead_records = 0
+
+    def pending(self):
+        """Returns [(event id, op, segment)] for everything Google hasn't confirmed."""
+        with self._lock:
+            return [(event_id, op, segment) for event_id, (op, segment) in self._pending.items()]
+
+    def __len__(self):
+        return len(self._pending)
+
+    def close(self):
+        with self._lock:
+            os.close(self._fd)
@@ -0,0 +1,56 @@
+"""Logging setup: leveled, structured and rotated.
+
+Modules log through logging.getLogger(__name__). configure_logging() sends
+everything at CLOCKIN_LOG_LEVEL (default INFO) and above to a rotating
+file, one JSON object per line. Fields passed with `extra=` become keys of
+that object. When stderr is a terminal, the same records are also printed
+there in plain text.
+"""
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import sys
+
+# Defaults for CLOCKIN_LOG_FILE and CLOCKIN_LOG_LEVEL.
+LOG_FILE = 'clockin.log'
+LOG_LEVEL = 'INFO'
+MAX_BYTES = 1024 * 1024
+BACKUP_COUNT = 5
+
+# Attributes every LogRecord has; anything else came in through `extra=`.
+_STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(path=None, level=None):
+    # Read here rather than at import, so .env.local can set them.
+    path = path or os.getenv('CLOCKIN_LOG_FILE', LOG_FILE)
+    level = (level or os.getenv('CLOCKIN_LOG_LEVEL', LOG_LEVEL)).upper()
+    root = logging.getLogger()
+    root.setLevel(level)
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT,
+                                                        encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    root.addHandler(file_handler)
+    if sys.stderr.isatty():
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        root.addHandler(console)
@@ -0,0 +1,136 @@
+"""In-process latency histograms.
+
+Code wraps an operation in `with timed('calendar.batch'):` or reports a
+duration it measured itself with observe(). Each name gets a histogram
+with fixed, roughly logarithmic buckets, so recording is O(1) and memory
+stays flat however long the app runs. snapshot() returns counts, sums and
+bucket-estimated percentiles for every name. The app writes it to
+CLOCKIN_METRICS_FILE periodically, and the control socket serves it as the
+`metrics` command.
+"""
+import bisect
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# Default for CLOCKIN_METRICS_FILE.
+METRICS_FILE = 'metrics.json'
+SNAPSHOT_INTERVAL_SECONDS = 60
+# Upper bounds in milliseconds; anything slower lands in the last bucket.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_lock = threading.Lock()
+_histograms = {}
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total_ms', 'min_ms', 'max_ms')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+        self.max_ms = ms if self.max_ms is None else max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        # The upper bound of the bucket holding that rank, capped at the true max.
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 3),
+            'min_ms': round(self.min_ms, 3),
+            'p50_ms': round(self.percentile(0.5), 3),
+            'p90_ms': round(self.percentile(0.9), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+            'max_ms': round(self.max_ms, 3),
+        }
+
+
+def observe(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(seconds * 1000)
+
+
+@contextlib.contextmanager
+def timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot():
+    with _lock:
+        return {name: histogram.summary() for name, histogram in sorted(_histograms.items())}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def metrics_file():
+    # Read when needed rather than at import, so .env.local can set it.
+    return os.getenv('CLOCKIN_METRICS_FILE', METRICS_FILE)
+
+
+def write_snapshot(path=None, extra=None):
+    """Atomically writes snapshot() (plus `extra`) to `path` as JSON."""
+    path = path or metrics_file()
+    data = {'generated_at': time.time(), 'latency': snapshot()}
+    if extra:
+        data.update(extra)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as metrics_file:
+        json.dump(data, metrics_file, indent=2)
+    os.replace(tmp_path, path)
+
+
+class SnapshotWriter(threading.Thread):
+    """Rewrites the metrics file every SNAPSHOT_INTERVAL_SECONDS until stopped."""
+
+    def __init__(self, get_extra=None, path=None, interval=SNAPSHOT_INTERVAL_SECONDS):
+        super().__init__(name="metrics", daemon=True)
+        self.get_extra = get_extra
+        self.path = path or metrics_file()
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            write_snapshot(self.path, self.get_extra() if self.get_extra else None)
+        except Exception:
+            log.exception("Could not write metrics snapshot")
+
+    def stop(self):
+        self._stopped.set()
+        self.write()
@@ -0,0 +1,87 @@
+"""The task being tracked, as plain epoch numbers.
+
+A Session records the task summary and its pause/resume history as an
+ordered list of closed (start, end) segments. Elapsed time is kept as a
+running total. Calendar request bodies are only built from a segment when
+it is flushed to Google.
+"""
+import datetime
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# On macOS CLOCK_MONOTONIC keeps counting while the machine sleeps; time.monotonic() does not.
+_MONOTONIC_CLOCK = getattr(time, 'CLOCK_MONOTONIC', None)
+
+
+def monotonic():
+    return time.clock_gettime(_MONOTONIC_CLOCK) if _MONOTONIC_CLOCK is not None else time.monotonic()
+
+
+@dataclass(slots=True)
+class Session:
+    summary: str
+    # Closed (start, end) segments in epoch seconds, oldest first.
+    segments: List[Tuple[float, float]] = field(default_factory=list)
+    # Epoch seconds when the open segment started, or None while paused.
+    running_since: Optional[float] = None
+    # monotonic() reading at the same moment; elapsed time is measured from it.
+    running_since_monotonic: Optional[float] = None
+    # Sum of all closed segments, kept up to date as they close.
+    closed_seconds: float = 0.0
+    # Calendar event the last closed segment was journaled as, and its span.
+    # A segment that resumes soon enough after it extends that event.
+    event_id: Optional[str] = None
+    event_start: Optional[float] = None
+    event_end: Optional[float] = None
+
+    @property
+    def is_running(self):
+        return self.running_since is not None
+
+    def continues_event(self, segment, gap_seconds):
+        """True if `segment` started within `gap_seconds` of the last journaled event's end."""
+        return self.event_id is not None and segment[0] - self.event_end <= gap_seconds
+
+    def start(self):
+        self.running_since = time.time()
+        self.running_since_monotonic = monotonic()
+
+    def pause(self):
+        """Closes the open segment and returns it as (start, end)."""
+        end = self.running_since + (monotonic() - self.running_since_monotonic)
+        segment = (self.running_since, end)
+        self.segments.append(segment)
+        self.closed_seconds += end - self.running_since
+        self.running_since = None
+        self.running_since_monotonic = None
+        return segment
+
+    def segment_elapsed(self):
+        """Seconds since the open segment started (0 while paused)."""
+        if self.running_since_monotonic is None:
+            return 0.0
+        return monotonic() - self.running_since_monotonic
+
+    def elapsed(self):
+        """Total tracked seconds across every segment."""
+        return self.closed_seconds + self.segment_elapsed()
+
+
+def _rfc3339(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+def patch_body(segment):
+    """Builds the Calendar patch body that moves an event's end."""
+    return {'end': {'dateTime': _rfc3339(segment['end']), 'timeZone': 'UTC'}}
+
+
+def event_body(event_id, segment):
+    """Builds the Calendar insert body for a journaled segment."""
+    return {
+        'id': event_id,
+        'summary': segment['summary'],
+        'start': {'dateTime': _rfc3339(segment['start']), 'timeZone': 'UTC'},
+        'end': {'dateTime': _rfc3339(segment['end']), 'timeZone': 'UTC'},
+    }
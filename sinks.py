@@ -0,0 +1,232 @@
+"""Fans session events out to independent destinations.
+
+The core publishes one SessionEvent per start, pause and stop, after the
+segment is safely in the journal. Each sink gets its own bounded queue and
+worker thread. A slow, failing or stuck sink therefore never delays the
+user's action or the other sinks. When a sink's queue is full, new events
+for that sink are dropped and counted.
+
+A new destination is a class with handle(event) and, optionally, close(),
+registered with EventBus.add().
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from formats import CSV_FIELDS, ICS_FOOTER, ICS_HEADER, csv_line, csv_row, ics_event
+from metrics import timed
+
+log = logging.getLogger(__name__)
+
+QUEUE_SIZE = 256
+CLOSE_TIMEOUT_SECONDS = 5
+WEBHOOK_TIMEOUT_SECONDS = 10
+
+
+@dataclass(slots=True, frozen=True)
+class SessionEvent:
+    kind: str  # 'start', 'pause' or 'stop'
+    summary: str
+    at: float  # epoch seconds
+    # For 'start': when the new segment began.
+    running_since: Optional[float] = None
+    # For 'pause' and 'stop' after a running segment: the calendar event it
+    # was journaled into, with the event's span so far.
+    event_id: Optional[str] = None
+    event_start: Optional[float] = None
+    event_end: Optional[float] = None
+    # True if the segment opened a new event, False if it extended event_id.
+    new_event: bool = False
+    # When that segment began; it ended at event_end.
+    segment_start: Optional[float] = None
+
+
+class _SinkWorker:
+    def __init__(self, sink, maxsize):
+        self.sink = sink
+        self.name = type(sink).__name__
+        self.queue = queue.Queue(maxsize)
+        self.handled = 0
+        self.failed = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name=f"sink-{self.name}", daemon=True)
+        self.thread.start()
+
+    def offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            log.warning(f"{self.name} is falling behind, dropped a {event.kind} event")
+
+    def _run(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            try:
+                with timed(f'sink.{self.name}'):
+                    self.sink.handle(event)
+                self.handled += 1
+            except Exception:
+                self.failed += 1
+                log.exception(f"{self.name} failed on {event.kind}")
+        close = getattr(self.sink, 'close', None)
+        if close:
+            try:
+                close()
+            except Exception:
+                log.exception(f"{self.name} failed to close")
+
+
+class EventBus:
+    def __init__(self):
+        self._workers = []
+
+    def add(self, sink, maxsize=QUEUE_SIZE):
+        self._workers.append(_SinkWorker(sink, maxsize))
+
+    def publish(self, event):
+        for worker in self._workers:
+            worker.offer(event)
+
+    def stats(self):
+        return {worker.name: {'handled': worker.handled, 'failed': worker.failed, 'dropped': worker.dropped,
+                              'queued': worker.queue.qsize()}
+                for worker in self._workers}
+
+    def close(self):
+        """Lets every sink finish what is queued, waiting a few seconds at most."""
+        for worker in self._workers:
+            try:
+                worker.queue.put(None, timeout=CLOSE_TIMEOUT_SECONDS)
+            except queue.Full:
+                log.warning(f"{worker.name} did not drain in time")
+        for worker in self._workers:
+            worker.thread.join(CLOSE_TIMEOUT_SECONDS)
+
+
+class CalendarSink:
+    """Wakes the sync worker; the journal already holds the segment."""
+
+    def __init__(self, sync_worker):
+        self.sync_worker = sync_worker
+
+    def handle(self, event):
+        if event.event_id:
+            self.sync_worker.wake()
+
+
+class HistorySink:
+    def __init__(self, history, task_index, on_recorded=None):
+        self.history = history
+        self.task_index = task_index
+        self.on_recorded = on_recorded
+
+    def handle(self, event):
+        if not event.event_id:
+            return
+        self.history.record(event.event_id, event.summary, event.event_start, event.event_end,
+                            segment=(event.segment_start, event.event_end))
+        if event.new_event:
+            self.task_index.record(event.summary, event.event_end)
+        if self.on_recorded:
+            self.on_recorded()
+
+
+class PresenceSink:
+    def __init__(self, get_presence):
+        # Discord can be switched on and off while running, so look it up per event.
+        self.get_presence = get_presence
+
+    def handle(self, event):
+        presence = self.get_presence()
+        if not presence:
+            return
+        # Unchanged payloads are never resent.
+        if event.kind == 'start':
+            self.show(presence, event.summary, event.running_since)
+        else:
+            presence.clear()
+
+    @staticmethod
+    def show(presence, summary, running_since):
+        presence.set(
+            details=summary,
+            start=int(running_since),
+            large_image="icon",  # Replace with image key of choice
+            large_text="Locked in",
+        )
+
+
+class WebhookSink:
+    """POSTs every event as JSON to a URL (CLOCKIN_WEBHOOK_URL)."""
+
+    def __init__(self, url):
+        self.url = url
+
+    def handle(self, event):
+        # Imported here so launches without a webhook don't pay for urllib.
+        import urllib.request
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(asdict(event)).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'User-Agent': 'cLockIn'},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT_SECONDS) as response:
+            response.read()
+
+
+class FileExportSink:
+    """Appends finished events to an .ics or .csv file (CLOCKIN_EXPORT_FILE).
+
+    A paused event can still be extended by a quick resume, so each event is
+    written once the next one starts or the task is stopped.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ics = path.lower().endswith('.ics')
+        self._open_event = None  # (event_id, summary, start, end) not yet written
+
+    def handle(self, event):
+        if event.event_id:
+            if self._open_event and self._open_event[0] != event.event_id:
+                self._write(*self._open_event)
+            self._open_event = (event.event_id, event.summary, event.event_start, event.event_end)
+        if event.kind == 'stop':
+            self.close()
+
+    def close(self):
+        if self._open_event:
+            self._write(*self._open_event)
+            self._open_event = None
+
+    def _write(self, event_id, summary, start, end):
+        if self.ics:
+            self._append_ics(ics_event(event_id, summary, start, end))
+        else:
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', newline='', encoding='utf-8') as export_file:
+                if new_file:
+                    export_file.write(csv_line(CSV_FIELDS))
+                export_file.write(csv_line(csv_row(event_id, summary, start, end)))
+
+    def _append_ics(self, vevent):
+        footer = ICS_FOOTER.encode('utf-8')
+        with open(self.path, 'ab+') as export_file:
+            export_file.seek(0, os.SEEK_END)
+            size = export_file.tell()
+            if size == 0:
+                export_file.write(ICS_HEADER.encode('utf-8'))
+            else:
+                # Insert before END:VCALENDAR so the file stays a valid calendar.
+                export_file.seek(max(0, size - len(footer)))
+                if export_file.read() == footer:
+                    export_file.truncate(size - len(footer))
+            export_file.write(vevent.encode('utf-8') + footer)
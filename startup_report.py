@@ -0,0 +1,50 @@
+"""Shows where cold-start time goes when cLockIn launches.
+
+Imports app.py in a fresh interpreter under `-X importtime` and prints the
+slowest top-level imports, so anything heavy that creeps back onto the
+launch path stands out:
+
+    python startup_report.py [--top N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+def import_times(module='app'):
+    """Yields (cumulative_us, self_us, module_name) for top-level imports."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Importing {module} failed")
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        # Nested imports are indented under whatever pulled them in.
+        if name.startswith('  '):
+            continue
+        yield int(cumulative_us), int(self_us), name.strip()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--top', type=int, default=15, help="number of imports to list")
+    args = arg_parser.parse_args()
+
+    rows = sorted(import_times(), reverse=True)
+    total_us = sum(cumulative_us for cumulative_us, _, _ in rows)
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative_us, self_us, name in rows[:args.top]:
+        print(f"{cumulative_us / 1000:10.1f}ms {self_us / 1000:8.1f}ms  {name}")
+    print(f"{total_us / 1000:10.1f}ms total import time across {len(rows)} top-level modules")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""In-memory index of past task summaries for the task input's autocomplete.
+
+Each task carries a frecency score: every use adds exp(DECAY * time), so
+recent uses count for more and frequent ones add up. Scores are kept as
+logarithms, which keeps them finite and means the ranking never has to be
+recomputed as time passes.
+
+Tasks are matched case-insensitively, first by prefix of the whole summary
+(a bisect over a sorted list of keys), then by word prefixes, so "rev pr"
+finds "Review PR #12". The short prefixes that match the most tasks have
+their results, and the tasks with a word under them, cached until a task
+under them is added.
+
+If that still leaves room, typed words of FUZZY_MIN_LENGTH or more match
+words containing them ("view" finds "Review PR"), and after that words
+starting with them give or take one typo: an extra letter, two swapped
+letters, or a wrong or missing letter after the first ("desgin" finds
+"Design"). Both are looked up among the distinct words, which are far
+fewer than the tasks, and a wrong or missing letter only where few words
+share the letters before it.
+
+Ranking a large set of matches costs more than finding them among all
+tasks kept in score order: when many tasks match, the best ones are
+usually near the top. Large match sets are therefore found by walking
+that order, with a budget, and ranked directly only if the walk runs long.
+"""
+import bisect
+import heapq
+import itertools
+import math
+import operator
+import threading
+
+HALF_LIFE_SECONDS = 14 * 24 * 3600
+DECAY = math.log(2) / HALF_LIFE_SECONDS
+SUGGESTION_LIMIT = 8
+CACHED_PREFIX_LENGTH = 2
+# How many times the expected walk length a walk may take before giving up.
+WALK_BUDGET_FACTOR = 4
+# Shorter words are only matched by prefix; one typo in them matches too much.
+FUZZY_MIN_LENGTH = 4
+# How many words a typed word may be compared with letter by letter.
+TYPO_SCAN_BUDGET = 500
+
+_key_of_ranked = operator.itemgetter(1)
+
+
+def _log_add_exp(a, b):
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def _key(summary):
+    return ' '.join(summary.casefold().split())
+
+
+class TaskIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scores = {}  # key -> log frecency score
+        self._summaries = {}  # key -> summary as last typed
+        self._keys = []  # every key, sorted
+        self._ranked = []  # (-score, key) for every key, best first
+        self._words = {}  # word -> set of keys containing it
+        self._sorted_words = []
+        self._word_text = ''  # _sorted_words joined by newlines, for substring search
+        self._cache = {}  # short prefix -> best keys
+        self._word_cache = {}  # short prefix -> keys with a word starting with it
+
+    def load(self, uses):
+        """Adds (summary, time) pairs in bulk, e.g. everything in the history."""
+        with self._lock:
+            for summary, when in uses:
+                self._add(summary, when, bulk=True)
+            self._keys.sort()
+            self._sorted_words.sort()
+            self._word_text = '\n'.join(self._sorted_words)
+            self._ranked = sorted((-score, key) for key, score in self._scores.items())
+            self._cache.clear()
+            self._word_cache.clear()
+            # Warm the caches here, off the main thread, rather than on the first keystrokes.
+            self._prefix_matches('', SUGGESTION_LIMIT)
+            for prefix in {word[:length] for word in self._words for length in range(1, CACHED_PREFIX_LENGTH + 1)}:
+                self._keys_with_word(prefix)
+
+    def record(self, summary, when):
+        with self._lock:
+            self._add(summary, when)
+
+    def _add(self, summary, when, bulk=False):
+        key = _key(summary)
+        if not key:
+            return
+        if key not in self._scores:
+            self._scores[key] = None
+            if bulk:
+                self._keys.append(key)
+            else:
+                bisect.insort(self._keys, key)
+            for word in set(key.split()):
+                if word not in self._words:
+                    self._words[word] = set()
+                    if bulk:
+                        self._sorted_words.append(word)
+                    else:
+                        bisect.insort(self._sorted_words, word)
+                        self._word_text = '\n'.join(self._sorted_words)
+                self._words[word].add(key)
+                if not bulk:
+                    for length in range(1, CACHED_PREFIX_LENGTH + 1):
+                        self._word_cache.pop(word[:length], None)
+        old_score = self._scores[key]
+        self._scores[key] = _log_add_exp(old_score, DECAY * when)
+        self._summaries[key] = summary.strip()
+        if not bulk:
+            if old_score is not None:
+                del self._ranked[bisect.bisect_left(self._ranked, (-old_score, key))]
+            bisect.insort(self._ranked, (-self._scores[key], key))
+            for length in range(CACHED_PREFIX_LENGTH + 1):
+                self._cache.pop(key[:length], None)
+
+    def _prefix_range(self, sorted_list, prefix):
+        first = bisect.bisect_left(sorted_list, prefix)
+        last = bisect.bisect_left(sorted_list, prefix + '\U0010ffff', first)
+        return sorted_list[first:last]
+
+    def _best(self, keys, limit):
+        return heapq.nlargest(limit, keys, key=self._scores.__getitem__)
+
+    def _walk(self, matching, tests, limit):
+        """The best `limit` keys passing every test, or None if walking for them looks too slow.
+
+        `matching` estimates how many keys pass. The tests run in C through
+        filter(), so they should be builtins such as set.__contains__.
+        """
+        ranked = self._ranked
+        if matching * matching <= limit * len(ranked):
+            return None
+        budget = WALK_BUDGET_FACTOR * limit * len(ranked) // matching
+        walked = map(_key_of_ranked, itertools.islice(ranked, budget))
+        for test in tests:
+            walked = filter(test, walked)
+        found = list(itertools.islice(walked, limit))
+        return found if len(found) == limit or budget >= len(ranked) else None
+
+    def _best_with_prefix(self, prefix, limit):
+        keys = self._prefix_range(self._keys, prefix)
+        found = self._walk(len(keys), [operator.methodcaller('startswith', prefix)], limit)
+        return found if found is not None else self._best(keys, limit)
+
+    def _prefix_matches(self, prefix, limit):
+        if len(prefix) > CACHED_PREFIX_LENGTH:
+            return self._best_with_prefix(prefix, limit)
+        if prefix not in self._cache:
+            self._cache[prefix] = self._best_with_prefix(prefix, SUGGESTION_LIMIT)
+        return self._cache[prefix][:limit]
+
+    def _keys_with_word(self, prefix):
+        # Short prefixes match the most words, so their unions are cached.
+        if prefix in self._word_cache:
+            return self._word_cache[prefix]
+        matches = [self._words[word] for word in self._prefix_range(self._sorted_words, prefix)]
+        # Callers only read the result, so a single word's set is used as is.
+        keys = matches[0] if len(matches) == 1 else set().union(*matches)
+        if len(prefix) <= CACHED_PREFIX_LENGTH:
+            self._word_cache[prefix] = keys
+        return keys
+
+    def _words_containing(self, word):
+        """Words with `word` anywhere in them."""
+        found = []
+        text = self._word_text
+        position = text.find(word)
+        while position >= 0:
+            start = text.rfind('\n', 0, position) + 1
+            end = text.find('\n', position)
+            end = len(text) if end < 0 else end
+            found.append(text[start:end])
+            position = text.find(word, end)
+        return found
+
+    def _words_like(self, word):
+        """Words starting with `word` give or take an extra, swapped, wrong or missing letter."""
+        found = []
+        for i in range(len(word)):
+            # One letter too many at i.
+            found += self._prefix_range(self._sorted_words, word[:i] + word[i + 1:])
+            if i + 1 < len(word):
+                # Letters i and i + 1 swapped.
+                found += self._prefix_range(self._sorted_words, word[:i] + word[i + 1] + word[i] + word[i + 2:])
+        # A wrong or a missing letter at i means comparing every word under
+        # word[:i]. Those lists grow as i shrinks, so stop once over budget.
+        scanned = 0
+        for i in range(len(word) - 1, 0, -1):
+            under = self._prefix_range(self._sorted_words, word[:i])
+            scanned += len(under)
+            if scanned > TYPO_SCAN_BUDGET:
+                break
+            # The tests run in C.
+            found += filter(operator.methodcaller('startswith', word[i + 1:], i + 1), under)
+            found += filter(operator.methodcaller('startswith', word[i:], i + 1), under)
+        return found
+
+    def _keys_with_any(self, words):
+        matches = [self._words[word] for word in set(words)]
+        return matches[0] if len(matches) == 1 else set().union(*matches)
+
+    def _keys_containing_word(self, word):
+        if len(word) < FUZZY_MIN_LENGTH:
+            return self._keys_with_word(word)
+        return self._keys_with_any(self._words_containing(word))
+
+    def _keys_with_word_like(self, word):
+        # Also takes words containing it, for queries that need both, e.g. "view desgin".
+        if len(word) < FUZZY_MIN_LENGTH:
+            return self._keys_with_word(word)
+        return self._keys_with_any(self._words_containing(word) + self._words_like(word))
+
+    def _word_matches(self, words, limit, keys_with):
+        candidates = sorted((keys_with(word) for word in set(words)), key=len)
+        # Estimated as if words turned up in tasks independently.
+        matching = len(self._ranked)
+        for keys in candidates:
+            matching = matching * len(keys) // max(1, len(self._ranked))
+        found = self._walk(matching, [keys.__contains__ for keys in candidates], limit)
+        if found is None:
+            found = self._best(candidates[0].intersection(*candidates[1:]), limit)
+        return found
+
+    def suggest(self, text, limit=SUGGESTION_LIMIT):
+        """Returns up to `limit` past summaries matching `text`, best first."""
+        prefix = _key(text)
+        with self._lock:
+            keys = self._prefix_matches(prefix, limit)
+            words = prefix.split()
+            tiers = [self._keys_with_word] if words else []
+            if any(len(word) >= FUZZY_MIN_LENGTH for word in words):
+                tiers += [self._keys_containing_word, self._keys_with_word_like]
+            for keys_with in tiers:
+                if len(keys) == limit:
+                    break
+                seen = set(keys)
+                keys += [key for key in self._word_matches(words, limit + len(keys), keys_with)
+                         if key not in seen][:limit - len(keys)]
+            return [self._summaries[key] for key in keys]
+
+    def __len__(self):
+        return len(self._scores)
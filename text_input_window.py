@@ -0,0 +1,138 @@
+import logging
+
+import objc
+from Cocoa import NSComboBox, NSApp, NSWindow, NSRect, NSButton, NSObject, NSBackingStoreBuffered, NSPoint, NSWindowCollectionBehaviorMoveToActiveSpace
+from Quartz import CGShieldingWindowLevel
+
+log = logging.getLogger(__name__)
+
+
+class TextInputWindow(NSObject):
+    def initWithCallback_suggester_(self, callback, suggest):
+        self = super(TextInputWindow, self).init()
+        if self is None:
+            return None
+        self.callback = callback
+        # suggest(text) returns past task summaries matching what's typed.
+        self.suggest = suggest
+        self.suggestions = []
+        self.window = None
+        return self
+
+    def createWindow(self):
+        log.debug("Creating text input window...")
+        self.window = NSWindow.alloc().initWithContentRect_styleMask_backing_defer_(
+            NSRect((0, 0), (400, 0)),
+            1 << 0,  # NSWindowStyleMaskBorderless
+            NSBackingStoreBuffered,
+            False
+        )
+        self.window.setLevel_(CGShieldingWindowLevel() + 1)  # Floating window above all others
+        self.window.setCollectionBehavior_(NSWindowCollectionBehaviorMoveToActiveSpace)
+        self.window.setTitleVisibility_(1)  # Hide title bar
+        self.window.setTitlebarAppearsTransparent_(True)
+        self.window.setBackgroundColor_(objc.nil)
+        self.window.setOpaque_(False)
+        self.window.setMovable_(False)
+        self.window.setHasShadow_(True)
+        self.window.setReleasedWhenClosed_(False)
+        self.window.setCanHide_(False)
+
+        # get screen dimensions
+        screen = self.window.screen()
+        screen_frame = screen.frame()
+        screen_width = screen_frame.size.width
+        screen_height = screen_frame.size.height
+        # get window dimensions
+        window_frame = self.window.frame()
+        window_width = window_frame.size.width
+        window_height = window_frame.size.height
+        # calculate the position of the window
+        x = (screen_width - window_width) / 2
+        y = screen_height - window_height - 30
+        self.window.setFrameOrigin_(NSPoint(x, y))
+
+        content_view = self.window.contentView()
+        
+        self.text_input = NSComboBox.alloc().initWithFrame_(((0, 0), (400, 30)))
+        self.text_input.setUsesDataSource_(True)
+        self.text_input.setDataSource_(self)
+        self.text_input.setDelegate_(self)
+        self.text_input.setCompletes_(True)  # inline-complete the best prefix match
+        self.text_input.setNumberOfVisibleItems_(8)
+        self.suggestions = self.suggest("")
+        self.text_input.setPlaceholderString_("What are you working on?")
+        self.text_input.setBezeled_(True)
+        self.text_input.setBezelStyle_(1)
+        self.text_input.setDrawsBackground_(False)
+        self.text_input.setFocusRingType_(1)
+        self.text_input.setWantsLayer_(True)
+        self.text_input.layer().setZPosition_(3)
+        self.text_input.setSelectable_(True)
+        self.text_input.setAllowsEditingTextAttributes_(True)
+        self.text_input.setEditable_(True)
+        self.text_input.setSelectable_(True)
+        self.text_input.setSelectable_(True)
+        self.text_input.cell().setWraps_(False)
+
+        content_view.addSubview_(self.text_input)
+
+        start_button = NSButton.alloc().initWithFrame_(((230, 110), (80, 24)))
+        start_button.setTitle_("Start")
+        start_button.setBezelStyle_(4)
+        start_button.setKeyEquivalent_("\r")  # Enter key triggers the button
+        start_button.setTarget_(self)
+        start_button.setAction_("startButtonClicked:")
+        content_view.addSubview_(start_button)
+
+        cancel_button = NSButton.alloc().initWithFrame_(((310, 110), (80, 24)))
+        cancel_button.setTitle_("Cancel")
+        cancel_button.setBezelStyle_(4)
+        cancel_button.setKeyEquivalent_("\x1b")  # Escape key triggers the button
+        cancel_button.setTarget_(self)
+        cancel_button.setAction_("cancelButtonClicked:")
+        content_view.addSubview_(cancel_button)
+
+        self.window.makeKeyAndOrderFront_(None)
+        NSApp.activateIgnoringOtherApps_(True)
+        log.debug("Text input window created.")
+
+    # NSComboBoxDataSource, backed by the current suggestions
+
+    def numberOfItemsInComboBox_(self, combo_box):
+        return len(self.suggestions)
+
+    def comboBox_objectValueForItemAtIndex_(self, combo_box, index):
+        return self.suggestions[index]
+
+    def comboBox_completedString_(self, combo_box, text):
+        # Can run before controlTextDidChange_, so look the text up directly.
+        for suggestion in self.suggest(text):
+            if suggestion.casefold().startswith(text.casefold()):
+                return suggestion
+        return None
+
+    def controlTextDidChange_(self, notification):
+        self.suggestions = self.suggest(self.text_input.stringValue())
+        self.text_input.reloadData()
+
+    def startButtonClicked_(self, sender):
+        log.debug(f"Start button clicked: {sender}")
+        self.callback(self.text_input.stringValue())
+        self.close_window()
+
+    def cancelButtonClicked_(self, sender):
+        log.debug(f"Cancel button clicked: {sender}")
+        self.callback(None)
+        self.close_window()
+
+    def windowDidResignKey_(self, notification):
+        log.debug("Window resigned key, closing...")
+        self.callback(None)
+        self.close_window()
+
+    def close_window(self):
+        if self.window:
+            log.debug(f"Closing text input window... {self}")
+            self.window.orderOut_(None)
+            log.debug("Text input window closed.")
@@ -0,0 +1,69 @@
+"""Renews the Google access token in the background shortly before it expires."""
+import datetime
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# Refresh this long before the access token expires.
+REFRESH_MARGIN_SECONDS = 5 * 60
+RETRY_MIN_SECONDS = 10
+RETRY_MAX_SECONDS = 10 * 60
+# Tokens without a known expiry are checked again after this long.
+IDLE_CHECK_SECONDS = 60 * 60
+
+
+class TokenRefresher(threading.Thread):
+    def __init__(self, credentials, http, on_refreshed, on_revoked):
+        super().__init__(name="token-refresh", daemon=True)
+        self.credentials = credentials
+        self.http = http
+        # Called on this thread with the credentials after every refresh.
+        self.on_refreshed = on_refreshed
+        # Called on this thread when Google rejects the refresh token for good.
+        self.on_revoked = on_revoked
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def seconds_until_due(self):
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return 0 if not self.credentials.token else IDLE_CHECK_SECONDS
+        # google-auth keeps expiry as a naive UTC datetime.
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return max(0, (expiry - now).total_seconds() - REFRESH_MARGIN_SECONDS)
+
+    def run(self):
+        from google.auth.exceptions import RefreshError
+
+        delay = None
+        while True:
+            wait = delay if delay is not None else self.seconds_until_due()
+            if self._stopped.wait(wait):
+                return
+            if delay is None and self.seconds_until_due() > 0:
+                continue
+            try:
+                # If another caller already renewed this token, this is a no-op.
+                self.http.refresh(stale_token=self.credentials.token)
+            except RefreshError as e:
+                if not getattr(e, 'retryable', False):
+                    log.warning(f"Refresh token was rejected: {e}")
+                    if not self._stopped.is_set():
+                        self.on_revoked()
+                    return
+                delay = min(RETRY_MAX_SECONDS, delay * 2) if delay else RETRY_MIN_SECONDS
+                log.warning(f"Token refresh failed, retrying in {delay}s: {e}")
+                continue
+            except Exception as e:
+                delay = min(RETRY_MAX_SECONDS, delay * 2) if delay else RETRY_MIN_SECONDS
+                log.warning(f"Token refresh failed, retrying in {delay}s: {e}")
+                continue
+            # Stopped while the refresh was in flight: these credentials are no longer in use.
+            if self._stopped.is_set():
+                return
+            delay = None
+            log.info(f"Access token refreshed, valid until {self.credentials.expiry}")
+            self.on_refreshed(self.credentials)
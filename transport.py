@@ -0,0 +1,71 @@
+"""One pooled, keep-alive HTTP transport shared by every Google service object.
+
+googleapiclient expects an httplib2.Http-style object with a request()
+method. By default it creates a separate httplib2 connection for every
+build() call, and those connections are not thread-safe. SessionHttp serves
+the same interface from a single requests.Session with a connection pool. A
+burst of calendar writes from the sync worker and the executor therefore
+reuses warm TLS connections.
+
+Token refresh happens here too, under a lock, so several callers that hit
+expiry at the same moment trigger only one refresh.
+"""
+import threading
+
+from metrics import timed
+
+POOL_SIZE = 8
+TIMEOUT_SECONDS = 60
+
+
+class SessionHttp:
+    def __init__(self, credentials, pool_size=POOL_SIZE):
+        import requests
+        from google.auth.transport.requests import Request
+
+        # Deliberately not called `credentials`: googleapiclient would find it
+        # and refresh on its own, outside refresh_lock.
+        self._credentials = credentials
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._auth_request = Request(session=self._session)
+        self.refresh_lock = threading.Lock()
+
+    def refresh(self, force=False, stale_token=None):
+        """Refreshes the access token unless it is still valid or another caller beat us to it."""
+        with self.refresh_lock:
+            credentials = self._credentials
+            if stale_token is not None and credentials.token != stale_token:
+                return
+            if force or stale_token is not None or not credentials.valid:
+                with timed('google.token_refresh'):
+                    credentials.refresh(self._auth_request)
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        import httplib2
+
+        if not self._credentials.valid:
+            self.refresh()
+        token = self._credentials.token
+        response = self._send(uri, method, body, headers)
+        if response.status_code == 401:
+            # Revoked or expired early; refresh once, however many callers saw the 401.
+            self.refresh(stale_token=token)
+            response = self._send(uri, method, body, headers)
+
+        info = {key.lower(): value for key, value in response.headers.items()}
+        # requests already decompressed the body.
+        info.pop('content-encoding', None)
+        info['status'] = str(response.status_code)
+        resp = httplib2.Response(info)
+        resp.reason = response.reason
+        return resp, response.content
+
+    def _send(self, uri, method, body, headers):
+        headers = dict(headers or {})
+        self._credentials.apply(headers)
+        return self._session.request(method, uri, data=body, headers=headers, timeout=TIMEOUT_SECONDS)
+
+    def close(self):
+        self._session.close()